@@ -1,7 +1,7 @@
 # ref https://m365.cloud.microsoft/chat/?fromcode=cmc&redirectid=8AD19A57E1AA4A088F874EAED5B2D5CE&auth=2&internalredirect=CCM
 
 import pygame
-import colorsys
+import numpy as np
 from tkinter import Tk, filedialog
 from github.Neothasia.src.Neothasia_python.qwen_versie.midi_parser import load_midi
 from vizualizer import (
@@ -9,7 +9,12 @@ from vizualizer import (
     draw_piano,
     draw_notes,
     draw_legend,
-    check_legend_click
+    prepare_notes,
+    piano_rect,
+    legend_rect,
+    check_legend_click,
+    track_color_table,
+    FPS
 )
 from audio_player import play_midi_with_soundfont
 from gui_controls import choose_color, export_colors
@@ -25,29 +30,37 @@ def main():
         return
 
     play_midi_with_soundfont(midi_file, soundfont_file)
-    notes = load_midi(midi_file)
+    notes = prepare_notes(load_midi(midi_file))
     screen, clock = init_visualizer()
     start_time = pygame.time.get_ticks()
 
-    num_tracks = max(note[2] for note in notes) + 1
-    track_colors = {
-        i: pygame.Color(*[int(c * 255) for c in colorsys.hsv_to_rgb(i / num_tracks, 1, 1)])
-        for i in range(num_tracks)
-    }
-    active_tracks = {i: True for i in range(num_tracks)}
+    # prepare_notes laat noten buiten het toetsenbordbereik weg; er kan dus niets overblijven
+    num_tracks = int(notes[2].max()) + 1 if len(notes[2]) else 1
+    track_colors = {i: pygame.Color(*rgb) for i, rgb in enumerate(track_color_table(num_tracks).tolist())}
+    active_tracks = np.ones(num_tracks, dtype=bool)
     solo_mode = False
 
+    # Alleen de gebieden die veranderd kunnen zijn naar het scherm sturen:
+    # de noten van dit en het vorige frame, het toetsenbord en de legenda.
+    static_rects = [piano_rect(), legend_rect(track_colors)]
+    prev_note_rects = []
+    pygame.display.flip()
+    full_redraw_needed = False
+
     running = True
     while running:
         screen.fill((0, 0, 0))
         time_elapsed = (pygame.time.get_ticks() - start_time) / 1000
-        active_notes = draw_notes(screen, notes, time_elapsed, track_colors, active_tracks)
+        active_notes, note_rects = draw_notes(screen, notes, time_elapsed, track_colors, active_tracks)
         draw_piano(screen, active_notes)
         draw_legend(screen, track_colors, active_tracks)
 
-        for event in pygame.event.get():
+        while (event := pygame.event.poll()).type != pygame.NOEVENT:
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.WINDOWEXPOSED:
+                # Het venster was (deels) bedekt, bijv. door de kleur- of exportdialoog; alles opnieuw tonen
+                full_redraw_needed = True
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 solo_mode, active_tracks = check_legend_click(
                     track_colors, active_tracks, event.pos, solo_mode
@@ -63,8 +76,13 @@ def main():
                 elif event.key == pygame.K_e:
                     export_colors(track_colors)
 
-        pygame.display.flip()
-        clock.tick(60)
+        if full_redraw_needed:
+            pygame.display.flip()
+            full_redraw_needed = False
+        else:
+            pygame.display.update(prev_note_rects + note_rects + static_rects)
+        prev_note_rects = note_rects
+        clock.tick(FPS)
 
     pygame.quit()
 
@@ -1,4 +1,5 @@
 import pygame
+import numpy as np
 
 WHITE_KEYS = ['C', 'D', 'E', 'F', 'G', 'A', 'B']
 BLACK_KEYS = ['C#', 'D#', 'F#', 'G#', 'A#']
@@ -7,53 +8,153 @@ KEY_HEIGHT = 100
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
+NOTE_SPEED = 100  # pixels per seconde
+NOTE_HEIGHT = 10
+# Het bereik dat naast elkaar op het scherm past (SCREEN_WIDTH / KEY_WIDTH kolommen, E2 t/m G5)
+MIN_MIDI_NOTE = 40
+MAX_MIDI_NOTE = MIN_MIDI_NOTE + SCREEN_WIDTH // KEY_WIDTH - 1
+
+_FONT = None
+_LABEL_SURFS = {}
+_LEGEND_SURF = None
+_LEGEND_STATE = None
+_NOTE_SURFS = {}
+_PIANO_SURF = None
+
+def _get_font():
+    global _FONT
+    if _FONT is None:
+        pygame.font.init()
+        _FONT = pygame.font.Font(None, 24)
+    return _FONT
+
+def _get_note_surf(color):
+    key = tuple(color)
+    surf = _NOTE_SURFS.get(key)
+    if surf is None:
+        surf = pygame.Surface((KEY_WIDTH, NOTE_HEIGHT)).convert()
+        surf.fill(color)
+        _NOTE_SURFS[key] = surf
+    return surf
 
 def init_visualizer():
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Neothasia_pythonV1")
+    # Alleen de events die de hoofdlus afhandelt; de rest komt niet eens in de wachtrij
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, pygame.WINDOWEXPOSED])
     clock = pygame.time.Clock()
+    font = _get_font()
+    for label in WHITE_KEYS + BLACK_KEYS:
+        for fg in [(0, 0, 0), (255, 255, 255)]:
+            _LABEL_SURFS[(label, fg)] = font.render(label, True, fg).convert_alpha()
+    global _PIANO_SURF
+    _PIANO_SURF = pygame.Surface((14 * KEY_WIDTH, KEY_HEIGHT)).convert()
+    for i in range(14):
+        _draw_key(_PIANO_SURF, i, False, 0)
     return screen, clock
 
+def track_color_table(num_tracks):
+    # Eén verzadigde HSV-kleur per track (gelijk verdeeld over de kleurencirkel), in één keer
+    # uitgerekend als (num_tracks, 3) uint8-array; zelfde uitkomst als colorsys.hsv_to_rgb(h, 1, 1)
+    h6 = np.arange(num_tracks) / num_tracks * 6
+    sector = h6.astype(int)
+    f = h6 - sector
+    q = 1 - f
+    t = 1 - q  # net als colorsys via 1 - (1 - f), zodat de afronding identiek is
+    one, zero = np.ones(num_tracks), np.zeros(num_tracks)
+    sector %= 6
+    r = np.choose(sector, [one, q, zero, zero, t, one])
+    g = np.choose(sector, [t, one, one, q, zero, zero])
+    b = np.choose(sector, [zero, zero, t, one, one, q])
+    return (np.column_stack((r, g, b)) * 255).astype(np.uint8)
+
+def piano_rect():
+    return pygame.Rect(0, SCREEN_HEIGHT - KEY_HEIGHT, 14 * KEY_WIDTH, KEY_HEIGHT)
+
+def legend_rect(track_colors):
+    return pygame.Rect(SCREEN_WIDTH - 150, 30, 150, 30 * len(track_colors))
+
+def _draw_key(surface, i, active, y):
+    key_color = (255, 255, 255) if i % 2 == 0 else (0, 0, 0)
+    if active:
+        key_color = (255, 255, 0)
+    pygame.draw.rect(surface, key_color, (i * KEY_WIDTH, y, KEY_WIDTH, KEY_HEIGHT))
+    label = WHITE_KEYS[i % len(WHITE_KEYS)] if key_color == (255, 255, 255) else BLACK_KEYS[i % len(BLACK_KEYS)]
+    fg = (0, 0, 0) if key_color == (255, 255, 255) else (255, 255, 255)
+    surface.blit(_LABEL_SURFS[(label, fg)], (i * KEY_WIDTH + 5, y + 5))
+
 def draw_piano(screen, active_notes):
-    for i in range(14):
-        key_color = (255, 255, 255) if i % 2 == 0 else (0, 0, 0)
-        if i in active_notes:
-            key_color = (255, 255, 0)
-        pygame.draw.rect(screen, key_color, (i * KEY_WIDTH, SCREEN_HEIGHT - KEY_HEIGHT, KEY_WIDTH, KEY_HEIGHT))
-        label = WHITE_KEYS[i % len(WHITE_KEYS)] if key_color == (255, 255, 255) else BLACK_KEYS[i % len(BLACK_KEYS)]
-        font = pygame.font.Font(None, 24)
-        text = font.render(label, True, (0, 0, 0) if key_color == (255, 255, 255) else (255, 255, 255))
-        screen.blit(text, (i * KEY_WIDTH + 5, SCREEN_HEIGHT - KEY_HEIGHT + 5))
+    # Het onverlichte toetsenbord staat klaar in _PIANO_SURF; alleen de actieve toetsen worden erover getekend
+    screen.blit(_PIANO_SURF, (0, SCREEN_HEIGHT - KEY_HEIGHT))
+    for i in sorted(active_notes):
+        _draw_key(screen, i, True, SCREEN_HEIGHT - KEY_HEIGHT)
+
+def prepare_notes(notes):
+    # (note, start_time, channel)-tuples -> NumPy-arrays, gesorteerd op starttijd, plus de X-positie per noot.
+    # Noten buiten MIN_MIDI_NOTE..MAX_MIDI_NOTE vallen weg; voorheen kwamen ze via een modulo
+    # over andere noten heen te liggen.
+    notes = sorted(notes, key=lambda n: n[1])
+    pitches = np.array([n[0] for n in notes], dtype=np.int64)
+    starts = np.array([n[1] for n in notes], dtype=np.float64)
+    channels = np.array([n[2] for n in notes], dtype=np.int64)
+    in_range = (pitches >= MIN_MIDI_NOTE) & (pitches <= MAX_MIDI_NOTE)
+    pitches, starts, channels = pitches[in_range], starts[in_range], channels[in_range]
+    xs = (pitches - MIN_MIDI_NOTE) * KEY_WIDTH
+    return pitches, starts, channels, xs
 
 def draw_notes(screen, notes, time_elapsed, track_colors, active_tracks):
+    pitches, starts, channels, xs = notes
+    # Alleen het venster van noten die nu in beeld zijn: gestart, en nog niet bovenaan uit beeld geschoven
+    lo = np.searchsorted(starts, time_elapsed - (SCREEN_HEIGHT + NOTE_HEIGHT) / NOTE_SPEED, side='right')
+    hi = np.searchsorted(starts, time_elapsed, side='right')
     active_notes = set()
-    for note, start_time, channel in notes:
-        if time_elapsed >= start_time and active_tracks[channel]:
-            y_pos = SCREEN_HEIGHT - (time_elapsed - start_time) * 100
-            pygame.draw.rect(screen, track_colors[channel], (note * KEY_WIDTH % SCREEN_WIDTH, y_pos, KEY_WIDTH, 10))
+    blits = []
+    for note, start_time, channel, x in zip(pitches[lo:hi].tolist(), starts[lo:hi].tolist(),
+                                            channels[lo:hi].tolist(), xs[lo:hi].tolist()):
+        if active_tracks[channel]:
+            y_pos = SCREEN_HEIGHT - (time_elapsed - start_time) * NOTE_SPEED
+            blits.append((_get_note_surf(track_colors[channel]), (x, y_pos)))
             active_notes.add(note % 14)
-    return active_notes
+    note_rects = screen.blits(blits)
+    return active_notes, note_rects
 
 def draw_legend(screen, track_colors, active_tracks):
-    font = pygame.font.Font(None, 24)
-    for i, (channel, color) in enumerate(track_colors.items()):
-        pygame.draw.rect(screen, color, (SCREEN_WIDTH - 150, 30 + i * 30, 20, 20))
-        text = font.render(f"Track {channel}", True, (255, 255, 255))
-        screen.blit(text, (SCREEN_WIDTH - 120, 30 + i * 30))
-        if active_tracks[channel]:
-            pygame.draw.rect(screen, (0, 255, 0), (SCREEN_WIDTH - 150, 30 + i * 30, 20, 20), 2)
+    # De legenda verandert alleen bij een andere kleur of aan/uit-stand; alleen dan opnieuw opbouwen
+    global _LEGEND_SURF, _LEGEND_STATE
+    state = (tuple((channel, tuple(color)) for channel, color in track_colors.items()), active_tracks.tobytes())
+    if state != _LEGEND_STATE:
+        font = _get_font()
+        rect = legend_rect(track_colors)
+        # Doorzichtige achtergrond met per-pixel alpha, zodat noten eronder zichtbaar blijven en de
+        # anti-aliased tekst geen donkere rand krijgt (wat met een zwarte colorkey wel gebeurt)
+        _LEGEND_SURF = pygame.Surface(rect.size, pygame.SRCALPHA).convert_alpha()
+        for i, (channel, color) in enumerate(track_colors.items()):
+            pygame.draw.rect(_LEGEND_SURF, color, (0, i * 30, 20, 20))
+            _LEGEND_SURF.blit(font.render(f"Track {channel}", True, (255, 255, 255)), (30, i * 30))
+            if active_tracks[channel]:
+                pygame.draw.rect(_LEGEND_SURF, (0, 255, 0), (0, i * 30, 20, 20), 2)
+        _LEGEND_STATE = state
+    screen.blit(_LEGEND_SURF, (SCREEN_WIDTH - 150, 30))
 
 def check_legend_click(track_colors, active_tracks, mouse_pos, solo_mode):
-    for i, channel in enumerate(track_colors.keys()):
-        if SCREEN_WIDTH - 150 <= mouse_pos[0] <= SCREEN_WIDTH - 130 and 30 + i * 30 <= mouse_pos[1] <= 50 + i * 30:
-            if solo_mode and active_tracks[channel]:
-                solo_mode = False
-                active_tracks = {k: True for k in active_tracks}
-            elif solo_mode:
-                active_tracks = {k: False for k in active_tracks}
-                active_tracks[channel] = True
-                solo_mode = True
-            else:
-                active_tracks[channel] = not active_tracks[channel]
+    # active_tracks is een NumPy bool-array (index = kanaal) en wordt ter plekke aangepast.
+    # De rijen liggen 30 px uit elkaar, dus de aangeklikte rij volgt direct uit de Y-positie.
+    x, y = mouse_pos
+    if not SCREEN_WIDTH - 150 <= x <= SCREEN_WIDTH - 130:
+        return solo_mode, active_tracks
+    i = (y - 30) // 30
+    if i < 0 or i >= len(track_colors) or y > 50 + i * 30:
+        return solo_mode, active_tracks
+    channel = list(track_colors)[i]
+    if solo_mode and active_tracks[channel]:
+        solo_mode = False
+        active_tracks.fill(True)
+    elif solo_mode:
+        active_tracks.fill(False)
+        active_tracks[channel] = True
+        solo_mode = True
+    else:
+        active_tracks[channel] = not active_tracks[channel]
     return solo_mode, active_tracks
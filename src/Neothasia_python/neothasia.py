@@ -5,6 +5,11 @@ import pygame
 import os
 import sys
 import math
+import hashlib
+import io
+import mmap
+import struct
+import numpy as np
 import mido # Zorg dat mido geïnstalleerd is: pip install mido
 from tkinter import Tk, filedialog # Voor bestandskiezer
 
@@ -33,6 +38,20 @@ BLACK_KEY_WIDTH = WHITE_KEY_WIDTH * 0.6
 BLACK_KEY_HEIGHT_RATIO = 0.6 # Zwarte toets is 60% van witte toets hoogte
 KEYBOARD_HEIGHT = 120
 ROLL_HEIGHT = SCREEN_HEIGHT - KEYBOARD_HEIGHT
+BLACK_KEY_MASK = 0b010101001010 # Bit n staat aan als toon n binnen het octaaf (C = 0) een zwarte toets is: 1, 3, 6, 8, 10
+
+def is_black_key(midi_note):
+    """Geeft 1 als de noot een zwarte toets is, anders 0."""
+    return (BLACK_KEY_MASK >> (midi_note % 12)) & 1
+
+# Geparste MIDI-bestanden worden hier bewaard, zodat een volgende keer laden het parsen overslaat
+MIDI_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "neothasia")
+MIDI_CACHE_VERSION = 2 # Ophogen als het formaat van de geparste noten verandert
+
+# Eén rij per noot. De velden zijn zo smal als MIDI toelaat (noot/velocity 0-127, kanaal 0-15),
+# zodat een noot 13 bytes kost in plaats van een Python-dict.
+NOTE_DTYPE = np.dtype([('note', np.int8), ('channel', np.int8), ('start_time', np.int32),
+                       ('duration', np.int32), ('velocity', np.int8), ('track', np.int16)])
 
 # Noten namen
 NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
@@ -44,107 +63,360 @@ def get_note_name(midi_note):
     note_name = NOTE_NAMES[midi_note % 12]
     return f"{note_name}{octave}"
 
+def build_key_layout():
+    """
+    Berekent één keer de X-positie en breedte (in hele pixels) van elke MIDI-noot op het toetsenbord.
+
+    De witte toetsen van A0 t/m C8 worden over de volle schermbreedte verdeeld en de zwarte toetsen
+    liggen op de grens tussen twee witte toetsen, net als in render_piano_keyboard, zodat de vallende noten precies op hun
+    toets landen. Noten buiten het bereik van het toetsenbord krijgen een X-positie links buiten beeld.
+
+    Returns:
+        tuple: (x per noot, breedte per noot, is_zwart per noot), elk een array van lengte 128.
+    """
+    is_black = ((BLACK_KEY_MASK >> (np.arange(128) % 12)) & 1).astype(bool)
+    num_white_keys = int(np.count_nonzero(~is_black[OCTAVE_START_MIDI:OCTAVE_END_MIDI + 1]))
+    white_key_width = SCREEN_WIDTH / num_white_keys
+    black_key_width = white_key_width * BLACK_KEY_WIDTH / WHITE_KEY_WIDTH
+
+    xs = np.full(128, -SCREEN_WIDTH, dtype=np.int16)
+    num_white_keys_before = 0
+    for note in range(OCTAVE_START_MIDI, OCTAVE_END_MIDI + 1):
+        if is_black[note]:
+            # Een zwarte toets ligt gecentreerd op de grens tussen de twee witte toetsen ernaast
+            xs[note] = int(num_white_keys_before * white_key_width - black_key_width / 2)
+        else:
+            xs[note] = int(num_white_keys_before * white_key_width)
+            num_white_keys_before += 1
+    widths = np.where(is_black, int(black_key_width), int(white_key_width)).astype(np.int16)
+    return xs, widths, is_black
+
+NOTE_X_LUT, NOTE_WIDTH_LUT, IS_BLACK_KEY = build_key_layout()
+
+def filter_keyboard_range(notes):
+    """Laat alleen noten over die op het toetsenbord (A0 t/m C8) liggen; de rest zou per frame buiten beeld getekend worden."""
+    in_range = (notes['note'] >= OCTAVE_START_MIDI) & (notes['note'] <= OCTAVE_END_MIDI)
+    return notes if in_range.all() else notes[in_range]
+
 # --- MIDI Parsing (hergebruik van de eerder gemaakte functie) ---
+def get_midi_cache_path(midi_filepath):
+    """Geeft het cachebestand voor een MIDI-bestand; de sleutel verandert mee met pad, wijzigingstijd en grootte."""
+    stat = os.stat(midi_filepath)
+    key = f"{MIDI_CACHE_VERSION}:{os.path.abspath(midi_filepath)}:{stat.st_mtime_ns}:{stat.st_size}"
+    return os.path.join(MIDI_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
 def parse_midi_file(midi_filepath):
     """
-    Parset een MIDI-bestand en extraheert noteninformatie.
+    Parset een MIDI-bestand en extraheert noteninformatie, met een cache op schijf.
+
+    Het resultaat van het parsen wordt als .npz in MIDI_CACHE_DIR bewaard. Bij een volgende keer
+    laden van hetzelfde (ongewijzigde) bestand worden de arrays direct ingelezen en wordt mido
+    helemaal niet gebruikt. Een onleesbaar cachebestand wordt genegeerd en overschreven.
+
+    Args en Returns zijn gelijk aan die van parse_midi_file_uncached().
+    """
+    try:
+        cache_path = get_midi_cache_path(midi_filepath)
+    except OSError:
+        cache_path = None # Bestand bestaat niet; de parser hieronder meldt de fout
+
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                tempo_changes = dict(zip(cached['tempo_ticks'].tolist(), cached['tempo_values'].tolist()))
+                return (cached['notes'], cached['track_names'].tolist(), int(cached['ticks_per_beat']),
+                        tempo_changes)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Cache voor {midi_filepath} kon niet gelezen worden, opnieuw parsen: {e}")
+
+    notes_data, track_names, ticks_per_beat, tempo_changes = parse_midi_file_uncached(midi_filepath)
+
+    # Alleen een geslaagde parse bewaren (bij een fout is ticks_per_beat 0)
+    if cache_path is not None and ticks_per_beat:
+        try:
+            os.makedirs(MIDI_CACHE_DIR, exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, notes=notes_data, track_names=np.array(track_names, dtype=str),
+                         ticks_per_beat=ticks_per_beat,
+                         tempo_ticks=np.array(list(tempo_changes.keys()), dtype=np.int64),
+                         tempo_values=np.array(list(tempo_changes.values()), dtype=np.int64))
+            os.replace(tmp_path, cache_path) # Nooit een half geschreven cachebestand achterlaten
+        except OSError as e:
+            print(f"Kon de MIDI-cache niet wegschrijven: {e}")
+
+    return notes_data, track_names, ticks_per_beat, tempo_changes
+
+def read_variable_length(data, pos):
+    """Leest een MIDI variable-length getal vanaf pos; geeft (waarde, positie na het getal) terug."""
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, pos
+
+def read_midi_events(data):
+    """
+    Leest de note- en tempo-events rechtstreeks uit de bytes van een Standard MIDI File.
+
+    Dit is een kleine toestandsmachine over de ruwe bytes (delta-tijden, running status, meta- en
+    sysex-berichten), zonder voor elk bericht een mido-object te maken. Alleen wat de pianorol
+    nodig heeft wordt bewaard. Bij alles wat niet strikt volgens de standaard is (of wat deze
+    lezer niet kent) volgt een ValueError; parse_midi_file_uncached valt dan terug op mido.
 
     Args:
-        midi_filepath (str): Het pad naar het MIDI-bestand.
+        data (bytes): De inhoud van het MIDI-bestand.
 
     Returns:
-        tuple: Een tuple bestaande uit:
-            - list: Een lijst van dicts, waarbij elke dict een noot representeert
-                    met 'note', 'start_time', 'duration', 'velocity', 'track_name', 'channel'.
-            - list: Een lijst van tracknamen (str).
-            - int: De ticks_per_beat van het MIDI-bestand.
-            - dict: Een dictionary met tempo-wijzigingen: {absolute_time_in_ticks: tempo_in_microseconds_per_beat}.
+        tuple: (ticks_per_beat, track_names, tempo_changes, events, track_event_counts), waarbij
+            events een platte lijst is met per event vijf getallen (absolute tick, is_note_on, noot,
+            kanaal, velocity) en track_event_counts het aantal events per track.
     """
-    notes_data = []
+    if data[:4] != b'MThd' or len(data) < 14:
+        raise ValueError("Geen MThd-header gevonden")
+    header_size = int.from_bytes(data[4:8], 'big')
+    if header_size < 6:
+        raise ValueError("MThd-header is te kort")
+    _, num_tracks, ticks_per_beat = struct.unpack_from('>hhh', data, 8)
+    pos = 8 + header_size
+
     track_names = []
     tempo_changes = {} # {absolute_time_in_ticks: tempo_in_microseconds_per_beat}
+    # Plat in plaats van een lijst tuples: NumPy zet een platte lijst getallen ruim twee keer zo snel om
+    events = []
+    add_event = events.extend
+    track_event_counts = []
+
+    for i in range(num_tracks):
+        if data[pos:pos + 4] != b'MTrk':
+            raise ValueError(f"Geen MTrk-header voor track {i}")
+        end = pos + 8 + int.from_bytes(data[pos + 4:pos + 8], 'big')
+        if end > len(data):
+            raise ValueError(f"Track {i} loopt voorbij het einde van het bestand")
+        pos += 8
+
+        track_name = None
+        current_track_time = 0
+        last_status = None
+        events_before_track = len(events)
+
+        while pos < end:
+            # Delta-tijd (variable length, hier uitgeschreven omdat dit voor elk bericht gebeurt)
+            byte = data[pos]
+            pos += 1
+            delta = byte & 0x7f
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                delta = (delta << 7) | (byte & 0x7f)
+            current_track_time += delta
+
+            status = data[pos]
+            if status & 0x80:
+                pos += 1
+                if status != 0xff: # Meta-berichten veranderen de running status niet
+                    last_status = status
+            elif last_status is not None and last_status < 0xf0:
+                status = last_status # Running status: de databyte hoort al bij dit bericht
+            else:
+                raise ValueError(f"Running status zonder voorgaand kanaalbericht in track {i}")
+
+            if status < 0xf0:
+                kind = status & 0xf0
+                if kind == 0x90 or kind == 0x80:
+                    note = data[pos]
+                    velocity = data[pos + 1]
+                    pos += 2
+                    if note > 127 or velocity > 127:
+                        raise ValueError(f"Ongeldige databyte in track {i}")
+                    # Een note_on met velocity 0 behandelen we als een note_off
+                    add_event((current_track_time, kind == 0x90 and velocity > 0, note, status & 0x0f, velocity))
+                elif kind == 0xc0 or kind == 0xd0: # Programmawissel en kanaaldruk: één databyte
+                    if data[pos] > 127:
+                        raise ValueError(f"Ongeldige databyte in track {i}")
+                    pos += 1
+                else:
+                    if data[pos] > 127 or data[pos + 1] > 127:
+                        raise ValueError(f"Ongeldige databyte in track {i}")
+                    pos += 2
+            elif status == 0xff:
+                meta_type = data[pos]
+                length, pos = read_variable_length(data, pos + 1)
+                if meta_type == 0x51: # set_tempo
+                    if length < 3:
+                        raise ValueError(f"Te kort tempo-bericht in track {i}")
+                    # Tempo-wijzigingen worden opgeslagen met de absolute tijd in ticks
+                    tempo_changes[current_track_time] = (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2]
+                elif meta_type == 0x03 and track_name is None: # De eerste tracknaam telt
+                    track_name = bytes(data[pos:pos + length]).decode('latin1')
+                pos += length
+            elif status == 0xf0 or status == 0xf7:
+                length, pos = read_variable_length(data, pos)
+                pos += length
+            else:
+                raise ValueError(f"Systeembericht 0x{status:02x} in track {i} wordt niet ondersteund")
 
-    try:
-        mid = mido.MidiFile(midi_filepath)
-    except FileNotFoundError:
-        print(f"Fout: Bestand niet gevonden op {midi_filepath}")
-        return [], [], 0, {}
-    except Exception as e:
-        print(f"Fout bij het laden van het MIDI-bestand: {e}")
-        return [], [], 0, {}
+        if pos != end:
+            raise ValueError(f"Laatste bericht van track {i} loopt over de trackgrens")
 
-    ticks_per_beat = mid.ticks_per_beat
-    
-    # Tijdelijke opslag voor actieve noten
-    # {note_number: {'start_time': absolute_time_in_ticks, 'velocity': velocity, 'channel': channel, 'track_name': track_name}}
-    active_notes = {}
+        track_names.append(track_name if track_name is not None else f"Track {i+1}") # Standaardnaam
+        track_event_counts.append((len(events) - events_before_track) // 5)
 
-    # Absolute tijd teller voor elke track (in ticks)
-    # We moeten de tijd per track bijhouden omdat messages in een track relatief zijn aan elkaar.
-    track_absolute_times = {i: 0 for i in range(len(mid.tracks))}
+    return ticks_per_beat, track_names, tempo_changes, events, track_event_counts
+
+def read_midi_events_mido(mid):
+    """Zelfde uitvoer als read_midi_events, maar via de berichten van een mido.MidiFile (langzamer, maar tolerant)."""
+    track_names = []
+    tempo_changes = {} # {absolute_time_in_ticks: tempo_in_microseconds_per_beat}
+    events = []
+    track_event_counts = []
 
     for i, track in enumerate(mid.tracks):
-        track_name = f"Track {i+1}" # Standaardnaam
-        # Probeer de tracknaam te vinden
-        for msg in track:
-            if msg.type == 'track_name':
-                track_name = msg.name
-                break
-        track_names.append(track_name)
-        
+        track_name = None
         current_track_time = 0 # Tijd in ticks voor de huidige track
+        events_before_track = len(events)
 
         for msg in track:
             current_track_time += msg.time # Voeg relatieve tijd toe aan absolute tijd voor deze track
+            msg_type = msg.type
 
-            if msg.type == 'note_on':
-                # Als velocity 0 is, behandelen we het als een note_off
-                if msg.velocity > 0:
-                    key = (msg.note, msg.channel, track_name) # Unieke sleutel voor de noot
-                    active_notes[key] = {
-                        'start_time': current_track_time,
-                        'velocity': msg.velocity,
-                        'channel': msg.channel,
-                        'track_name': track_name
-                    }
-                else: # velocity == 0, dus het is een note_off
-                    key = (msg.note, msg.channel, track_name)
-                    if key in active_notes:
-                        note_info = active_notes.pop(key)
-                        duration = current_track_time - note_info['start_time']
-                        if duration > 0: # Zorg ervoor dat de duur positief is
-                            notes_data.append({
-                                'note': note_info['note'],
-                                'start_time': note_info['start_time'],
-                                'duration': duration,
-                                'velocity': note_info['velocity'],
-                                'track_name': note_info['track_name'],
-                                'channel': note_info['channel']
-                            })
-            elif msg.type == 'note_off':
-                key = (msg.note, msg.channel, track_name)
-                if key in active_notes:
-                    note_info = active_notes.pop(key)
-                    duration = current_track_time - note_info['start_time']
-                    if duration > 0:
-                        notes_data.append({
-                            'note': note_info['note'],
-                            'start_time': note_info['start_time'],
-                            'duration': duration,
-                            'velocity': note_info['velocity'],
-                            'track_name': note_info['track_name'],
-                            'channel': note_info['channel']
-                        })
-            elif msg.type == 'set_tempo':
+            if msg_type == 'note_on' or msg_type == 'note_off':
+                # Een note_on met velocity 0 behandelen we als een note_off
+                events.extend((current_track_time, msg_type == 'note_on' and msg.velocity > 0,
+                               msg.note, msg.channel, msg.velocity))
+            elif msg_type == 'set_tempo':
                 # Tempo-wijzigingen worden opgeslagen met de absolute tijd in ticks
                 tempo_changes[current_track_time] = msg.tempo
+            elif msg_type == 'track_name' and track_name is None:
+                track_name = msg.name # De eerste tracknaam telt
+
+        track_names.append(track_name if track_name is not None else f"Track {i+1}") # Standaardnaam
+        track_event_counts.append((len(events) - events_before_track) // 5)
+
+    return mid.ticks_per_beat, track_names, tempo_changes, events, track_event_counts
+
+def parse_midi_file_uncached(midi_filepath):
+    """
+    Parset een MIDI-bestand en extraheert noteninformatie.
+
+    De bytes worden met read_midi_events in één doorloop gelezen (met mido als terugval voor
+    bestanden die niet strikt volgens de standaard zijn); het koppelen van note_on aan note_off
+    gebeurt daarna gevectoriseerd met NumPy.
+
+    Args:
+        midi_filepath (str): Het pad naar het MIDI-bestand.
+
+    Returns:
+        tuple: Een tuple bestaande uit:
+            - np.ndarray: Een structured array (NOTE_DTYPE) met één rij per noot en de velden
+                    'note', 'channel', 'start_time', 'duration', 'velocity', 'track' (index in de tracklijst),
+                    gesorteerd op 'start_time'.
+            - list: Een lijst van tracknamen (str).
+            - int: De ticks_per_beat van het MIDI-bestand.
+            - dict: Een dictionary met tempo-wijzigingen: {absolute_time_in_ticks: tempo_in_microseconds_per_beat}.
+    """
+    try:
+        # Het bestand wordt gemapt in plaats van ingelezen: de parser leest de bytes dan direct
+        # uit de page cache van het besturingssysteem, zonder eerst een kopie van het hele bestand.
+        with open(midi_filepath, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # Een leeg bestand kan niet gemapt worden
+                data = b''
+    except FileNotFoundError:
+        print(f"Fout: Bestand niet gevonden op {midi_filepath}")
+        return np.empty(0, dtype=NOTE_DTYPE), [], 0, {}
+    except OSError as e:
+        print(f"Fout bij het laden van het MIDI-bestand: {e}")
+        return np.empty(0, dtype=NOTE_DTYPE), [], 0, {}
+
+    try:
+        ticks_per_beat, track_names, tempo_changes, events, track_event_counts = read_midi_events(data)
+    except (ValueError, IndexError, struct.error):
+        # Niet strikt volgens de standaard; mido is langzamer maar vergevingsgezinder (of geeft een duidelijke fout).
+        # clip=True kapt databytes boven 127 af in plaats van het hele bestand te weigeren.
+        try:
+            mid = mido.MidiFile(file=io.BytesIO(data), clip=True)
+        except Exception as e:
+            print(f"Fout bij het laden van het MIDI-bestand: {e}")
+            return np.empty(0, dtype=NOTE_DTYPE), [], 0, {}
+        ticks_per_beat, track_names, tempo_changes, events, track_event_counts = read_midi_events_mido(mid)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+    # Eén (n, 5)-array voor alle events (uit de platte lijst); kolommen: tick, is_on, noot, kanaal, velocity
+    event_array = np.array(events, dtype=np.int64).reshape(-1, 5)
+    ticks = event_array[:, 0]
+    is_on = event_array[:, 1].astype(bool)
+    notes = event_array[:, 2]
+    channels = event_array[:, 3]
+    velocities = event_array[:, 4]
+    tracks = np.repeat(np.arange(len(track_event_counts), dtype=np.int64), track_event_counts)
+
+    # Een noot wordt in MIDI geïdentificeerd door (kanaal, noot): 16 x 128 vakjes per track.
+    # Dat vakje wordt één geheel getal, waarop in één keer stabiel gesorteerd wordt; binnen een vakje
+    # blijft de oorspronkelijke berichtvolgorde (en daarmee de tijdsvolgorde) behouden.
+    slots = (tracks * 16 + channels) * 128 + notes
+    order = np.argsort(slots, kind='stable')
+    slots, ticks, is_on, notes = slots[order], ticks[order], is_on[order], notes[order]
+    channels, velocities, tracks = channels[order], velocities[order], tracks[order]
+
+    # Een noot is een note_on die direct gevolgd wordt door een note_off in hetzelfde vakje.
+    # Een tweede note_on overschrijft de eerste en een losse note_off wordt genegeerd.
+    same_key = slots[1:] == slots[:-1]
+    is_pair = is_on[:-1] & ~is_on[1:] & same_key
+    starts = np.flatnonzero(is_pair)
+    durations = ticks[starts + 1] - ticks[starts]
+    starts = starts[durations > 0] # Zorg ervoor dat de duur positief is
+    durations = durations[durations > 0]
+
+    notes_data = np.empty(len(starts), dtype=NOTE_DTYPE)
+    notes_data['note'] = notes[starts]
+    notes_data['channel'] = channels[starts]
+    notes_data['start_time'] = ticks[starts]
+    notes_data['duration'] = durations
+    notes_data['velocity'] = velocities[starts]
+    notes_data['track'] = tracks[starts]
 
     # Sorteer de noten op starttijd voor eenvoudigere verwerking later
-    notes_data.sort(key=lambda x: x['start_time'])
+    notes_data = notes_data[np.argsort(notes_data['start_time'], kind='stable')]
 
     return notes_data, track_names, ticks_per_beat, tempo_changes
 
 
+class TempoMap:
+    """
+    Zet absolute MIDI-ticks om naar milliseconden en terug, met alle tempo-wijzigingen uit het bestand.
+
+    Tussen twee tempo-wijzigingen is het verband lineair. De knikpunten (tick, ms) worden één keer
+    bij het laden uitgerekend; een omzetting is daarna een np.searchsorted plus één vermenigvuldiging.
+    Werkt zowel voor losse getallen als voor NumPy-arrays.
+    """
+    DEFAULT_TEMPO = 500000 # Microseconden per beat (120 BPM) zolang het bestand niets anders aangeeft
+
+    def __init__(self, tempo_changes, ticks_per_beat):
+        tempos = dict(tempo_changes)
+        tempos.setdefault(0, self.DEFAULT_TEMPO)
+        break_ticks = sorted(tempos)
+        us_per_beat = np.array([tempos[tick] for tick in break_ticks], dtype=np.float64)
+
+        self.tick_breaks = np.array(break_ticks, dtype=np.float64)
+        self.ms_per_tick = us_per_beat / max(ticks_per_beat, 1) / 1000.0
+        self.ms_breaks = np.concatenate(([0.0], np.cumsum(np.diff(self.tick_breaks) * self.ms_per_tick[:-1])))
+        self.initial_bpm = 60_000_000 / us_per_beat[0]
+
+    def ticks_to_ms(self, ticks):
+        segment = np.maximum(np.searchsorted(self.tick_breaks, ticks, side='right') - 1, 0)
+        return self.ms_breaks[segment] + (ticks - self.tick_breaks[segment]) * self.ms_per_tick[segment]
+
+    def ms_to_ticks(self, ms):
+        segment = np.maximum(np.searchsorted(self.ms_breaks, ms, side='right') - 1, 0)
+        return self.tick_breaks[segment] + (ms - self.ms_breaks[segment]) / self.ms_per_tick[segment]
+
+
 # --- UI Elementen (Knoppen, Dropdowns, Sliders) ---
 # Een simpele implementatie voor dropdown, knop en slider.
 # Voor een robuustere UI zou men een specifieke GUI-bibliotheek of een Pygame UI-uitbreiding gebruiken.
@@ -158,13 +430,14 @@ class Button:
         self.hover_color = hover_color
         self.action = action
         self.is_hovered = False
+        # De tekst verandert niet, dus één keer renderen (in het pixelformaat van het scherm, zie convert_alpha)
+        self.text_surf = font.render(text, True, BLACK).convert_alpha()
+        self.text_rect = self.text_surf.get_rect(center=self.rect.center)
 
     def draw(self, surface):
         current_color = self.hover_color if self.is_hovered else self.color
         pygame.draw.rect(surface, current_color, self.rect)
-        text_surf = self.font.render(self.text, True, BLACK)
-        text_rect = text_surf.get_rect(center=self.rect.center)
-        surface.blit(text_surf, text_rect)
+        surface.blit(self.text_surf, self.text_rect)
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEMOTION:
@@ -177,6 +450,12 @@ class Button:
         return False
 
 class Dropdown:
+    # Terugkeerwaarden van handle_event; alles behalve NONE telt als 'afgehandeld'
+    NONE = 0
+    OPENED = 1
+    CLOSED = 2
+    SELECTION_CHANGED = 3
+
     def __init__(self, x, y, width, height, options, font, default_selection_index=0):
         self.rect = pygame.Rect(x, y, width, height)
         self.options = options
@@ -185,14 +464,20 @@ class Dropdown:
         self.is_open = False
         self.option_height = height
         self.max_display_options = 5 # Hoeveel opties zichtbaar zijn in de dropdown
+        # De rechthoeken van de zichtbare opties liggen vast, dus één keer berekenen
+        self.option_rects = [
+            pygame.Rect(x, self.rect.bottom + i * height, width, height)
+            for i in range(min(len(options), self.max_display_options))
+        ]
+        # Alle optieteksten worden vooraf gerenderd; draw() blit ze alleen nog
+        self.option_surfs = [font.render(option, True, BLACK).convert_alpha() for option in options]
 
     def draw(self, surface):
         # Draw selected option
         pygame.draw.rect(surface, LIGHT_GRAY, self.rect)
         pygame.draw.rect(surface, BLACK, self.rect, 2)
-        text_surf = self.font.render(self.options[self.selected_option_index], True, BLACK)
-        text_rect = text_surf.get_rect(center=self.rect.center)
-        surface.blit(text_surf, text_rect)
+        text_surf = self.option_surfs[self.selected_option_index]
+        surface.blit(text_surf, text_surf.get_rect(center=self.rect.center))
 
         # Draw dropdown arrow
         pygame.draw.polygon(surface, BLACK, [
@@ -203,31 +488,26 @@ class Dropdown:
 
         # Draw open options
         if self.is_open:
-            for i, option in enumerate(self.options):
-                if i >= self.max_display_options: # Beperk aantal zichtbare opties
-                    break
-                option_rect = pygame.Rect(self.rect.x, self.rect.bottom + i * self.option_height, self.rect.width, self.option_height)
+            for option_text_surf, option_rect in zip(self.option_surfs, self.option_rects): # Alleen de zichtbare opties
                 pygame.draw.rect(surface, WHITE, option_rect)
                 pygame.draw.rect(surface, BLACK, option_rect, 1)
-                option_text_surf = self.font.render(option, True, BLACK)
-                option_text_rect = option_text_surf.get_rect(center=option_rect.center)
-                surface.blit(option_text_surf, option_text_rect)
+                surface.blit(option_text_surf, option_text_surf.get_rect(center=option_rect.center))
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             if self.rect.collidepoint(event.pos):
                 self.is_open = not self.is_open
-                return True
+                return Dropdown.OPENED if self.is_open else Dropdown.CLOSED
             elif self.is_open:
-                for i, option in enumerate(self.options):
-                    if i >= self.max_display_options:
-                        break
-                    option_rect = pygame.Rect(self.rect.x, self.rect.bottom + i * self.option_height, self.rect.width, self.option_height)
-                    if option_rect.collidepoint(event.pos):
-                        self.selected_option_index = i
-                        self.is_open = False
-                        return True
-        return False
+                # De opties liggen direct onder elkaar, dus de aangeklikte optie volgt uit de Y-positie
+                x, y = event.pos
+                index = (y - self.rect.bottom) // self.option_height
+                if self.rect.left <= x < self.rect.right and 0 <= index < len(self.option_rects):
+                    changed = index != self.selected_option_index
+                    self.selected_option_index = index
+                    self.is_open = False
+                    return Dropdown.SELECTION_CHANGED if changed else Dropdown.CLOSED
+        return Dropdown.NONE
 
     def get_selected_option(self):
         return self.options[self.selected_option_index]
@@ -242,40 +522,58 @@ class Slider:
         self.label = label
         self.dragging = False
         self.handle_radius = height / 2
+        # De geometrie van de baan ligt vast; één keer uitrekenen in plaats van bij elk muis-event
+        self.track_x0 = self.rect.x + self.handle_radius
+        self.track_width = self.rect.width - 2 * self.handle_radius
+        self.track_width_inv = 1.0 / self.track_width
+        self.val_scale = max_val - min_val
+        self.label_surf = None # Gerenderd label; alleen opnieuw renderen als de waarde verandert
+        self.label_val = None
+        # Het type van de beginwaarde bepaalt hoe de waarde getoond wordt; na het slepen is val
+        # altijd een float, maar een slider voor hele getallen blijft hele getallen tonen
+        if isinstance(initial_val, float):
+            self.label_format, self.label_type = "{}: {:.1f}", float
+        else:
+            self.label_format, self.label_type = "{}: {}", int
 
     def draw(self, surface):
         # Slider track
-        pygame.draw.line(surface, DARK_GRAY, (self.rect.x + self.handle_radius, self.rect.centery), 
+        pygame.draw.line(surface, DARK_GRAY, (self.track_x0, self.rect.centery), 
                          (self.rect.right - self.handle_radius, self.rect.centery), 5)
         
         # Slider handle
-        handle_x = self.rect.x + self.handle_radius + (self.val - self.min_val) / (self.max_val - self.min_val) * (self.rect.width - 2 * self.handle_radius)
+        handle_x = self.get_handle_x()
         pygame.draw.circle(surface, BLUE, (int(handle_x), self.rect.centery), int(self.handle_radius))
         pygame.draw.circle(surface, BLACK, (int(handle_x), self.rect.centery), int(self.handle_radius), 2)
 
         # Label and value
-        label_text = f"{self.label}: {self.val:.1f}" if isinstance(self.val, float) else f"{self.label}: {int(self.val)}"
-        text_surf = self.font.render(label_text, True, BLACK)
-        text_rect = text_surf.get_rect(midleft=(self.rect.right + 10, self.rect.centery))
-        surface.blit(text_surf, text_rect)
+        if self.val != self.label_val:
+            label_text = self.label_format.format(self.label, self.label_type(self.val))
+            self.label_surf = self.font.render(label_text, True, BLACK).convert_alpha()
+            self.label_val = self.val
+        surface.blit(self.label_surf, self.label_surf.get_rect(midleft=(self.rect.right + 10, self.rect.centery)))
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            handle_x = self.rect.x + self.handle_radius + (self.val - self.min_val) / (self.max_val - self.min_val) * (self.rect.width - 2 * self.handle_radius)
-            handle_rect = pygame.Rect(handle_x - self.handle_radius, self.rect.centery - self.handle_radius, self.handle_radius * 2, self.handle_radius * 2)
-            if handle_rect.collidepoint(event.pos):
+            # De handle is een cirkel; een afstandstest kost geen Rect per klik
+            dx = event.pos[0] - self.get_handle_x()
+            dy = event.pos[1] - self.rect.centery
+            if dx * dx + dy * dy <= self.handle_radius * self.handle_radius:
                 self.dragging = True
                 return True
         elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
             self.dragging = False
             return True
         elif event.type == pygame.MOUSEMOTION and self.dragging:
-            normalized_x = (event.pos[0] - (self.rect.x + self.handle_radius)) / (self.rect.width - 2 * self.handle_radius)
-            normalized_x = max(0.0, min(1.0, normalized_x))
-            self.val = self.min_val + normalized_x * (self.max_val - self.min_val)
+            normalized_x = (event.pos[0] - self.track_x0) * self.track_width_inv
+            normalized_x = 0.0 if normalized_x < 0.0 else 1.0 if normalized_x > 1.0 else normalized_x
+            self.val = self.min_val + normalized_x * self.val_scale
             return True
         return False
 
+    def get_handle_x(self):
+        return self.track_x0 + (self.val - self.min_val) / self.val_scale * self.track_width
+
     def get_value(self):
         return self.val
 
@@ -288,6 +586,10 @@ class PianoRollApp:
         pygame.font.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Neothesia Python V4")
+        # Alleen events waar de app iets mee doet in de wachtrij laten komen; op frames zonder
+        # invoer is de event-lus in run() dan direct klaar
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION, pygame.WINDOWEXPOSED])
         self.clock = pygame.time.Clock()
 
         self.font_small = pygame.font.Font(None, 24)
@@ -295,17 +597,28 @@ class PianoRollApp:
         self.font_large = pygame.font.Font(None, 48)
 
         self.midi_notes = []
+        self.track_note_indices = [] # Per track de indices in midi_notes, gesorteerd op starttijd
         self.all_tracks = []
         self.ticks_per_beat = 0
         self.tempo_changes = {} # {tick: microseconds_per_beat}
+        self.tempo_map = TempoMap({}, 480)
 
-        self.current_notes_on_screen = pygame.sprite.Group() # Voor vallende noten
+        # Vallende noten als Struct-of-Arrays: één rij (x, y, breedte, hoogte) per noot in beeld
+        self.note_rects_on_screen = np.empty((0, 4), dtype=int)
+        # Voorgevulde nootkolommen per breedte; een noot wordt als uitsnede hiervan geblit
+        self.note_column_surfaces = {}
+        for width in np.unique(NOTE_WIDTH_LUT).tolist():
+            self.note_column_surfaces[width] = pygame.Surface((width, SCREEN_HEIGHT)).convert()
+            self.note_column_surfaces[width].fill(NOTE_COLOR)
 
         self.running = True
         self.playing = False
         self.paused = False
         self.start_time = 0 # Tijd (in ms) waarop afspelen is gestart
         self.pause_offset = 0 # Tijd (in ms) die verstreken is voor de pauze
+        # Positie in het stuk (ms) op het moment start_time, en de afspeelsnelheid sindsdien; zie get_current_song_time_ms
+        self.song_time_offset_ms = 0.0
+        self.clock_speed = None
 
         # Rollende noten snelheid: Aantal pixels per seconde.
         # Moet afhangen van BPM en schermgrootte
@@ -334,17 +647,48 @@ class PianoRollApp:
         self.time_signature_top_slider = Slider(650, 20, 100, 20, 1, 16, self.beats_per_measure_top, self.font_small, "Maat (T)")
         self.time_signature_bottom_slider = Slider(650, 50, 100, 20, 1, 16, self.beats_per_measure_bottom, self.font_small, "Maat (B)")
 
-        self.ui_elements = [
-            self.load_midi_button, self.play_button, self.pause_button, self.stop_button,
-            self.bpm_slider, self.fall_speed_slider, self.time_signature_top_slider, self.time_signature_bottom_slider
-        ]
+        self.buttons = [self.load_midi_button, self.play_button, self.pause_button, self.stop_button]
+        self.sliders = [self.bpm_slider, self.fall_speed_slider, self.time_signature_top_slider, self.time_signature_bottom_slider]
+        self.ui_elements = self.buttons + self.sliders
         
         self.loaded_midi_filename = ""
+        self.loaded_label_surf = None # "Geladen: ..." wordt alleen bij het laden van een bestand gerenderd
+        self.keyboard_surface = self.render_piano_keyboard() # Het toetsenbord verandert niet, dus één keer tekenen
+        # De achtergrond van de pianorol hangt alleen af van een paar sliders; zie draw_piano_roll_background
+        self.roll_background_surface = None
+        self.roll_background_key = None
+        # Per frame wordt alleen de pianorol naar het scherm gestuurd; het toetsenbord eronder verandert
+        # niet en wordt alleen bij de eerste frame en na een WINDOWEXPOSED opnieuw getekend en getoond
+        self.roll_rect = pygame.Rect(0, 0, SCREEN_WIDTH, ROLL_HEIGHT)
+        self.full_redraw_needed = True
         self.notes_to_spawn = [] # Lijst van noten die nog moeten verschijnen
         self.next_note_index = 0
 
+        # Per-noot arrays van de geselecteerde track (gesorteerd op starttijd), gevuld in prepare_notes_for_playback.
+        # Begin en einde staan al in milliseconden (volgens de tempomap), zodat tempo-wijzigingen per frame niets kosten.
+        self.note_start_ms = np.empty(0)
+        self.note_end_ms = np.empty(0)
+        self.note_xs = np.empty(0)
+        self.note_widths = np.empty(0)
+        self.max_note_duration_ms = 0.0
+        # Rechthoek per noot (x, -bovenkant t.o.v. tijdstip 0, breedte, hoogte) in hele pixels; hangt alleen
+        # af van de schaal (pixels per ms) en wordt pas opnieuw berekend als valsnelheid of BPM verandert.
+        # int32 is ruim genoeg (zelfs uren muziek op de snelste schaal blijft ver onder 2^31 pixels)
+        # en halveert het geheugenverkeer per frame ten opzichte van int64.
+        self.note_rects = np.empty((0, 4), dtype=np.int32)
+        self.scaled_pixels_per_ms = None
+        # Voor welk geladen bestand en welke track de arrays hierboven klaarstaan; zie get_playback_key
+        self.midi_load_count = 0
+        self.prepared_playback_key = None
+        # Eén verborgen Tk-root voor alle bestandskiezers, aangemaakt bij de eerste keer laden; een
+        # nieuwe Tk() per klik start telkens een complete Tcl-interpreter (en ruimt die nooit op)
+        self.tk_root = None
+
+
     def load_midi_file(self):
-        Tk().withdraw() # Verberg het hoofdtkinter venster
+        if self.tk_root is None:
+            self.tk_root = Tk()
+            self.tk_root.withdraw() # Verberg het hoofdtkinter venster
         # Initialiseer een bestandskiezer voor MIDI-bestanden
         file_path = filedialog.askopenfilename(
             title="Selecteer een MIDI-bestand",
@@ -352,14 +696,26 @@ class PianoRollApp:
         )
         if file_path:
             self.loaded_midi_filename = os.path.basename(file_path)
+            self.loaded_label_surf = self.font_small.render(f"Geladen: {self.loaded_midi_filename}", True, BLACK).convert_alpha()
             print(f"Laden van MIDI-bestand: {file_path}")
             notes_data, track_names, ticks_per_beat, tempo_changes = parse_midi_file(file_path)
             
-            if notes_data:
+            if len(notes_data):
                 self.midi_notes = notes_data
+                # Eén keer stabiel op track sorteren; elk stuk blijft zo op starttijd gesorteerd en
+                # een andere track kiezen wordt een opzoeking in plaats van een filter over alle noten
+                order = np.argsort(notes_data['track'], kind='stable')
+                bounds = np.searchsorted(notes_data['track'][order], np.arange(len(track_names) + 1))
+                self.track_note_indices = [order[bounds[i]:bounds[i + 1]] for i in range(len(track_names))]
                 self.all_tracks = track_names
                 self.ticks_per_beat = ticks_per_beat
                 self.tempo_changes = tempo_changes
+                self.tempo_map = TempoMap(tempo_changes, ticks_per_beat)
+                self.midi_load_count += 1
+                # De BPM-slider begint op het begintempo van het bestand; verschuiven versnelt of vertraagt
+                # het hele stuk, inclusief alle tempo-wijzigingen
+                self.bpm = round(min(max(self.tempo_map.initial_bpm, self.bpm_slider.min_val), self.bpm_slider.max_val))
+                self.bpm_slider.val = self.bpm
                 print(f"MIDI bestand geladen: {len(self.midi_notes)} noten, {len(self.all_tracks)} tracks.")
                 
                 # Initialiseer track dropdown
@@ -379,9 +735,11 @@ class PianoRollApp:
             else:
                 print("Laden van MIDI-bestand mislukt of geen noten gevonden.")
                 self.midi_notes = []
+                self.track_note_indices = []
                 self.all_tracks = []
                 self.ticks_per_beat = 0
                 self.tempo_changes = {}
+                self.tempo_map = TempoMap({}, 480)
                 # Verwijder dropdowns als geen bestand is geladen
                 if self.track_dropdown in self.ui_elements: self.ui_elements.remove(self.track_dropdown)
                 if self.instrument_dropdown in self.ui_elements: self.ui_elements.remove(self.instrument_dropdown)
@@ -391,25 +749,46 @@ class PianoRollApp:
 
     def prepare_notes_for_playback(self):
         """Filtert noten op basis van de geselecteerde track en reset de afspeelstatus."""
-        self.current_notes_on_screen.empty()
+        self.note_rects_on_screen = np.empty((0, 4), dtype=int)
         self.notes_to_spawn = []
         self.next_note_index = 0
 
         if self.current_selected_track:
-            self.notes_to_spawn = [
-                note for note in self.midi_notes 
-                if note['track_name'] == self.current_selected_track
-            ]
+            # De tracks staan als index in de noten-array; de dropdown-index hoort bij dezelfde tracklijst
+            track_index = self.track_dropdown.selected_option_index
+            self.notes_to_spawn = self.midi_notes[self.track_note_indices[track_index]]
+            self.notes_to_spawn = filter_keyboard_range(self.notes_to_spawn)
             print(f"Geselecteerde track: '{self.current_selected_track}'. Aantal noten om af te spelen: {len(self.notes_to_spawn)}")
         else:
-            self.notes_to_spawn = list(self.midi_notes) # Speel alle noten af als geen track geselecteerd is
+            self.notes_to_spawn = filter_keyboard_range(self.midi_notes) # Speel alle noten af als geen track geselecteerd is
             print(f"Geen specifieke track geselecteerd. Speelt alle {len(self.notes_to_spawn)} noten af.")
-        
-        # Sorteer de noten opnieuw, voor het geval dat filtering de volgorde heeft verstoord
-        self.notes_to_spawn.sort(key=lambda x: x['start_time'])
+        # Opnieuw sorteren is niet nodig: parse_midi_file levert de noten op starttijd en de
+        # indices per track zijn met een stabiele sortering gemaakt, dus die volgorde blijft behouden
+
+        # Alles wat per noot vastligt wordt hier één keer berekend in plaats van per frame
+        note_starts = self.notes_to_spawn['start_time'].astype(np.int64)
+        self.note_start_ms = self.tempo_map.ticks_to_ms(note_starts)
+        self.note_end_ms = self.tempo_map.ticks_to_ms(note_starts + self.notes_to_spawn['duration'])
+        self.note_xs = NOTE_X_LUT[self.notes_to_spawn['note']]
+        self.note_widths = NOTE_WIDTH_LUT[self.notes_to_spawn['note']]
+        self.max_note_duration_ms = float((self.note_end_ms - self.note_start_ms).max()) if len(self.note_start_ms) else 0.0
+        self.scaled_pixels_per_ms = None # Geschaalde arrays horen nog bij de vorige noten
+        self.prepared_playback_key = self.get_playback_key()
+
+    def get_playback_key(self):
+        """Alles waar prepare_notes_for_playback van afhangt: het geladen bestand en de gekozen track."""
+        track_index = self.track_dropdown.selected_option_index if self.current_selected_track else None
+        return (self.midi_load_count, track_index)
+
+    def on_track_changed(self):
+        """Een andere track is gekozen in de dropdown: stop het afspelen en prepareer de noten opnieuw."""
+        self.current_selected_track = self.track_dropdown.get_selected_option()
+        self.stop_midi() # Stop en reset afspelen
+        self.prepare_notes_for_playback() # Laad nieuwe noten voor weergave
+        print(f"Track geselecteerd: {self.current_selected_track}")
 
     def play_midi(self):
-        if not self.midi_notes:
+        if len(self.midi_notes) == 0:
             print("Geen MIDI-bestand geladen om af te spelen.")
             return
 
@@ -424,9 +803,13 @@ class PianoRollApp:
             self.paused = False
             self.start_time = pygame.time.get_ticks() # Registreer de starttijd
             self.pause_offset = 0
-            self.current_notes_on_screen.empty() # Leeg alle noten op het scherm
+            self.song_time_offset_ms = 0.0
+            self.clock_speed = None
+            self.note_rects_on_screen = np.empty((0, 4), dtype=int) # Leeg alle noten op het scherm
             self.next_note_index = 0 # Reset de noot-index
-            self.prepare_notes_for_playback()
+            # Laden en een andere track kiezen prepareren de noten al; alleen opnieuw doen als dat achterloopt
+            if self.prepared_playback_key != self.get_playback_key():
+                self.prepare_notes_for_playback()
             print("Afspelen gestart.")
 
     def pause_midi(self):
@@ -441,259 +824,147 @@ class PianoRollApp:
         self.paused = False
         self.start_time = 0
         self.pause_offset = 0
-        self.current_notes_on_screen.empty() # Verwijder alle noten van het scherm
+        self.song_time_offset_ms = 0.0
+        self.clock_speed = None
+        self.note_rects_on_screen = np.empty((0, 4), dtype=int) # Verwijder alle noten van het scherm
         self.next_note_index = 0 # Reset de noot-index
         print("Afspelen gestopt.")
 
-    def get_current_midi_time_in_ticks(self):
-        """Berekent de huidige afspeeltijd in MIDI-ticks."""
+    def get_current_song_time_ms(self):
+        """
+        Berekent de huidige positie in het stuk, in milliseconden volgens de tempomap.
+
+        De tijd volgt steeds opnieuw uit de gehele milliseconden van pygame.time.get_ticks() (er wordt
+        niets per frame opgeteld, dus er sluipt geen afwijking in). De tempo-wijzigingen uit het bestand
+        zitten al in de notentijden; de BPM-slider schaalt alleen de snelheid. Verandert die snelheid,
+        dan wordt de positie tot nu toe vastgelegd en geldt de nieuwe snelheid pas vanaf dat moment;
+        anders zou het stuk verspringen (en bij vertragen zelfs terugspringen).
+        """
         if not self.playing and not self.paused:
-            return 0
-        
-        current_playback_time_ms = pygame.time.get_ticks() - self.start_time # Verstreken tijd sinds start/hervat
-        
-        # Converteer milliseconden naar ticks.
-        # Dit is complexer door tempo-wijzigingen. Voor nu een simpele benadering.
-        # In een echte implementatie moet je door de tempo_changes loopen om de exacte ticks te bepalen.
-        # Voorlopig gaan we uit van een constante BPM voor deze conversie.
-        
-        # Microseconds per beat = 60,000,000 / BPM
-        # Ticks per milliseconde = (ticks_per_beat * BPM) / 60000
-        # Ticks = current_playback_time_ms * (ticks_per_beat * BPM / 60000)
-        
-        # Vereenvoudigde benadering (voor demonstratie):
-        # Stel dat 1 beat = 1 seconde voor valsnelheid bepaling, dan 1 tick = 1/ticks_per_beat seconde.
-        # current_midi_time_ticks = (current_playback_time_ms / 1000.0) * (self.bpm / 60.0) * self.ticks_per_beat
-        
-        # Voor nauwkeurigheid met variabele tempo:
-        # Dit is een *vereenvoudigde* implementatie van tempo-handling.
-        # Een robuuste implementatie zou een lijst van (tick_time, real_time) paren moeten bijhouden
-        # en interpoleren, of de tempo_changes dictionary itereren.
-        
-        # Hier gebruiken we de huidige BPM slider waarde om ms naar ticks te converteren.
-        # Dit is niet ideaal voor MIDI-bestanden met ingebouwde tempo-wijzigingen,
-        # maar voldoende voor basis synchronisatie met een aanpasbare BPM.
-        
-        current_bpm = self.bpm_slider.get_value()
-        ms_per_beat = (60 / current_bpm) * 1000 # Milliseconden per beat
-        ticks_per_ms = self.ticks_per_beat / ms_per_beat
-        
-        return current_playback_time_ms * ticks_per_ms
+            return 0.0
+
+        now = pygame.time.get_ticks()
+        speed = self.get_playback_speed()
+        if speed != self.clock_speed:
+            if self.clock_speed is not None:
+                self.song_time_offset_ms += (now - self.start_time) * self.clock_speed
+                self.start_time = now
+            self.clock_speed = speed
+
+        return self.song_time_offset_ms + (now - self.start_time) * speed
+
+    def get_playback_speed(self):
+        """Afspeelsnelheid t.o.v. het tempo uit het bestand (1.0 zolang de BPM-slider niet is verschoven)."""
+        return self.bpm_slider.get_value() / self.bpm
 
     def run(self):
         while self.running:
-            dt = self.clock.tick(FPS) / 1000.0 # Delta time in seconden
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
+            # Events één voor één ophalen; zo wordt er per frame geen lijst aangemaakt
+            while (event := pygame.event.poll()).type != pygame.NOEVENT:
+                event_type = event.type
+                if event_type == pygame.MOUSEMOTION:
+                    # Veruit het drukste event; alleen de hover van de knoppen en een slider
+                    # die versleept wordt doen er iets mee
+                    for button in self.buttons:
+                        button.handle_event(event)
+                    for slider in self.sliders:
+                        if slider.dragging:
+                            slider.handle_event(event)
+                elif event_type == pygame.MOUSEBUTTONUP:
+                    # Loslaten stopt het slepen van elke slider, niet alleen van de eerste in de lijst
+                    for slider in self.sliders:
+                        slider.handle_event(event)
+                elif event_type == pygame.MOUSEBUTTONDOWN:
+                    for element in self.ui_elements:
+                        result = element.handle_event(event)
+                        if result:
+                            # De track-dropdown meldt zelf of de selectie veranderd is
+                            if element is self.track_dropdown and result == Dropdown.SELECTION_CHANGED:
+                                self.on_track_changed()
+                            break
+                elif event_type == pygame.WINDOWEXPOSED:
+                    self.full_redraw_needed = True # Het venster was (deels) bedekt; alles opnieuw tonen
+                elif event_type == pygame.QUIT:
                     self.running = False
-                
-                handled_by_ui = False
-                for element in self.ui_elements:
-                    if element.handle_event(event):
-                        handled_by_ui = True
-                        break
-                
-                if not handled_by_ui:
-                    # Specifieke handler voor dropdown selectie verandering
-                    if self.track_dropdown and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                        if self.track_dropdown.is_open and any(
-                            pygame.Rect(self.track_dropdown.rect.x, 
-                                        self.track_dropdown.rect.bottom + i * self.track_dropdown.option_height, 
-                                        self.track_dropdown.rect.width, 
-                                        self.track_dropdown.option_height).collidepoint(event.pos) 
-                            for i in range(len(self.track_dropdown.options))
-                        ):
-                            # Track selectie is gewijzigd, prepareer noten opnieuw
-                            if self.current_selected_track != self.track_dropdown.get_selected_option():
-                                self.current_selected_track = self.track_dropdown.get_selected_option()
-                                self.stop_midi() # Stop en reset afspelen
-                                self.prepare_notes_for_playback() # Laad nieuwe noten voor weergave
-                                print(f"Track geselecteerd: {self.current_selected_track}")
-
 
             # Update logica
             if self.playing:
-                current_midi_tick = self.get_current_midi_time_in_ticks()
-                
-                # Spawn nieuwe noten
-                while self.next_note_index < len(self.notes_to_spawn):
-                    note_info = self.notes_to_spawn[self.next_note_index]
-                    # We willen noten spawnen die op of na de huidige speeltijd zouden moeten 'beginnen'
-                    # Maar we laten ze al eerder in beeld verschijnen, zodat ze van boven kunnen vallen.
-                    # Bepaal de 'verschijntijd' van de noot bovenaan het scherm.
-                    # Dit is (start_time - tijd_om_scherm_over_te_steken).
-                    
-                    # De hoogte van de pianorol bepaalt de 'reistijd'.
-                    # We willen dat de noot precies op `start_time` de 'speellijn' bereikt (onderaan de pianorol).
-                    # De snelheid wordt beïnvloed door self.fall_speed_factor en self.bpm_slider.get_value()
-                    
-                    # Tijd die een noot nodig heeft om het scherm over te steken (in ms)
-                    # Stel dat het scherm een "hoogte" heeft in beats. Hoeveel beats passen er in de pianorol?
-                    # Een noot beweegt van boven naar beneden. De "speellijn" is de onderkant van de pianorol.
-                    # Als de noot op 'start_time' de speellijn moet bereiken, en het duurt X ms om te vallen,
-                    # dan moet de noot op (start_time_in_ms - X_ms) al beginnen met vallen.
-                    
-                    # Deze 'offset_in_ticks' bepaalt hoe ver noten vooruit worden 'voorbereid' en gespawnd.
-                    # Dit moet worden afgestemd op de valsnelheid en schermhoogte.
-                    # Voor nu een heuristische waarde, dit moet gekoppeld worden aan valsnelheid.
-                    
-                    # Hoeveel tijd (in ticks) een noot nodig heeft om van boven naar beneden te vallen.
-                    # Dit is afhankelijk van de 'visuele' valsnelheid en de lengte van de pianorol.
-                    # Laten we aannemen dat de pianorol een vaste 'visuele duur' representeert.
-                    # Bijv. 4 beats lang (dit moet aanpasbaar worden).
-                    
-                    # Stel, de pianorol toont 4 beats aan noten tegelijk.
-                    # Dan is de 'valduur' 4 beats.
-                    # Valduur in ticks = 4 * self.ticks_per_beat
-                    
-                    # De snelheid waarmee de noten bewegen is 'pixels per seconde'.
-                    # De hoogte van de roll is ROLL_HEIGHT.
-                    # Tijd om te vallen (sec) = ROLL_HEIGHT / (basis_valsnelheid * self.fall_speed_factor)
-                    # basis_valsnelheid moet hier 'pixels per tick' of 'pixels per beat' zijn
-                    
-                    # Een simpeler model: de noten reizen van boven naar beneden in een vaste 'echte tijd',
-                    # en de BPM bepaalt hoe veel ticks dat is.
-                    # Laat de noot bijvoorbeeld 2 seconden duren om te vallen.
-                    FALL_TIME_SECONDS = 2.0 / self.fall_speed_slider.get_value() # Pas valsnelheid aan
-                    fall_time_ms = FALL_TIME_SECONDS * 1000
-                    
-                    # Converteer val_tijd_ms naar MIDI ticks
-                    current_bpm = self.bpm_slider.get_value()
-                    ms_per_beat = (60 / current_bpm) * 1000
-                    ticks_per_ms = self.ticks_per_beat / ms_per_beat
-                    
-                    fall_time_ticks = fall_time_ms * ticks_per_ms
-
-                    # Spawn noot als de starttijd min de valtijd gelijk is aan of voor de huidige tijd
-                    if note_info['start_time'] - fall_time_ticks <= current_midi_tick:
-                        # Bereken de X-positie op basis van het nootnummer
-                        note_x = self.get_note_x_position(note_info['note'])
-                        
-                        # Bereken de breedte van de noot
-                        note_width = WHITE_KEY_WIDTH if note_info['note'] % 12 in [0, 2, 4, 5, 7, 9, 11] else BLACK_KEY_WIDTH
-
-                        # De noot wordt bovenaan de pianorol gespawnd
-                        note_y_start = - (note_info['duration'] / self.ticks_per_beat) * (ROLL_HEIGHT / FALL_TIME_SECONDS / (current_bpm / 60)) 
-                        # De bovenstaande berekening van note_y_start is complex. Simpeler:
-                        # De noot wordt altijd helemaal bovenaan gespawnd, en de lengte representeert de duur.
-                        # De y-positie wordt dan dynamisch berekend.
-                        
-                        # Nootlengte in pixels: afhankelijk van duur en valsnelheid
-                        # Duur in ms = (note_info['duration'] / self.ticks_per_beat) * ms_per_beat
-                        note_duration_ms = (note_info['duration'] / ticks_per_ms)
-                        note_height_pixels = (note_duration_ms / 1000.0) * (ROLL_HEIGHT / FALL_TIME_SECONDS) # pixels per seconde * duur in seconden
-                        
-                        new_note_sprite = FallingNote(
-                            note_info['note'],
-                            note_info['start_time'],
-                            note_info['duration'],
-                            note_x, 
-                            note_width, 
-                            note_height_pixels,
-                            current_bpm,
-                            self.ticks_per_beat,
-                            self.screen.get_height(), # Totale schermhoogte voor referentie
-                            KEYBOARD_HEIGHT,
-                            FALL_TIME_SECONDS
-                        )
-                        self.current_notes_on_screen.add(new_note_sprite)
-                        self.next_note_index += 1
-                    else:
-                        break # Noten zijn gesorteerd, dus we kunnen stoppen met spawnen
-
-                # Update de positie van de vallende noten
-                # Pass current_midi_tick zodat noten hun Y-positie kunnen berekenen
-                for note_sprite in self.current_notes_on_screen:
-                    note_sprite.update(current_midi_tick)
-
-                # Verwijder noten die van het scherm zijn gevallen
-                for note_sprite in self.current_notes_on_screen:
-                    if note_sprite.rect.top > self.screen.get_height() - KEYBOARD_HEIGHT: # Noten zijn beneden de speellijn
-                        # We kunnen hier later een 'trigger' toevoegen voor audio afspelen
-                        # Voor nu verwijderen we ze als ze het toetsenbord passeren
-                        if note_sprite.rect.top > self.screen.get_height(): # Helemaal buiten beeld
-                            self.current_notes_on_screen.remove(note_sprite)
-                        
+                self.update_falling_notes(self.get_current_song_time_ms())
+
             # Rendering
             self.draw()
+            self.clock.tick(FPS) # Slaapt de rest van het frame weg (SDL_Delay), zonder de CPU bezig te houden
 
         pygame.quit()
         sys.exit()
 
-    def get_note_x_position(self, midi_note):
-        """Berekent de x-positie voor een noot op het pianotoetsenbord."""
-        # Dit is een vereenvoudigde berekening voor plaatsing op de pianorol.
-        # Een echte pianotoetsenbord layout is complexer door zwarte toetsen.
-        # Voorlopig plaatsen we ze gewoon naast elkaar.
+    def get_fall_time_ms(self):
+        """Berekent hoeveel milliseconden van het stuk er tussen de bovenkant van de rol en de speellijn passen."""
+        # De noten reizen van boven naar beneden in een vaste 'echte tijd' (2 seconden bij valsnelheid 1.0);
+        # bij een hogere afspeelsnelheid past er in die tijd meer van het stuk.
+        return 2.0 / self.fall_speed_slider.get_value() * 1000 * self.get_playback_speed()
 
-        # Aantal witte toetsen in een octaaf: C, D, E, F, G, A, B (7)
-        # Totaal aantal witte toetsen in ons bereik (A0 tot C8 = 88 toetsen)
-        # Midi 21 (A0) tot Midi 108 (C8)
-        # Totaal 88 noten.
-        
-        # We moeten de X-positie op de virtuele pianorol mapen.
-        # De breedte van de pianorol is SCREEN_WIDTH.
-        # We verdelen dit over 88 noten.
-        # Dit is een placeholder en moet nauwkeuriger worden.
-        # Voor nu: elke noot krijgt een vaste breedte, beginnend vanaf de linkerkant.
-        # MIDI noten: 21 (A0) tot 108 (C8).
-        
-        # Bereken de start X-positie voor de hele reeks noten
-        total_white_keys = 52 # Aantal witte toetsen van A0 (21) tot C8 (108)
-        # (108 - 21) + 1 = 88 totale noten.
-        # A0=21, A#0=22, B0=23, C1=24 etc.
-        
-        # Een meer realistische X-positie mapping zou zijn:
-        # Bereken de X-posities voor alle *witte* toetsen.
-        # De zwarte toetsen liggen daar tussenin en zijn smaller.
-        
-        # Offset van de start noot (A0 = MIDI 21) naar C0 (MIDI 24)
-        midi_note_relative_to_C0 = midi_note - 24 # MIDI 24 is C1
-        
-        num_white_keys_left_of_note = 0
-        current_midi_for_pos = OCTAVE_START_MIDI
-        white_key_indices = [0, 2, 4, 5, 7, 9, 11] # C, D, E, F, G, A, B
-        
-        # Bereken de x-positie op basis van de witte toetsen
-        x_offset = 0
-        for i in range(OCTAVE_START_MIDI, midi_note):
-            if i % 12 in white_key_indices:
-                x_offset += WHITE_KEY_WIDTH
-            else: # Zwarte toets
-                pass # Zwarte toetsen krijgen geen extra offset in deze telling
-        
-        # De X-coördinaat op de pianorol begint links
-        # Dit is een *uitdaging* voor een nauwkeurige weergave.
-        # Voor een simpele start: we behandelen elke noot alsof het een vaste kolom heeft.
-        # We zullen de noten plaatsen als kolommen in de pianorol.
-        # Het totale bereik van noten is 88 (van 21 tot 108).
-        # We verdelen de breedte van het scherm over deze noten.
-        
-        # Breedte per 'nootkolom' in de pianorol
-        num_playable_notes = OCTAVE_END_MIDI - OCTAVE_START_MIDI + 1 # 88 noten
-        note_column_width = SCREEN_WIDTH / num_playable_notes
+    def update_falling_notes(self, current_ms):
+        """
+        Berekent de rechthoeken van alle noten die op dit moment in beeld zijn.
 
-        # X-positie van de linkerkant van de nootkolom
-        return (midi_note - OCTAVE_START_MIDI) * note_column_width
+        De noten zijn gesorteerd op starttijd, dus de noten in beeld vormen een aaneengesloten
+        venster in de arrays. Dat venster wordt met np.searchsorted gevonden, waarna alle
+        Y-posities in één gevectoriseerde berekening worden bepaald.
 
-    def draw_piano_roll_background(self):
-        """Tekent de achtergrond van de pianorol (lijnen en balken)."""
-        pygame.draw.rect(self.screen, DARK_GRAY, (0, 0, SCREEN_WIDTH, ROLL_HEIGHT))
+        Alles wat niet van het huidige tijdstip afhangt ligt klaar in note_rects (in hele pixels) en
+        verandert alleen als een slider verschuift. Per frame is er dan één kopie van het venster, één
+        integer-optelling op de y-kolom en één masker; geen losse tijdelijke arrays per kolom.
+        """
+        fall_time_ms = self.get_fall_time_ms()
+        pixels_per_ms = ROLL_HEIGHT / fall_time_ms
+        if pixels_per_ms != self.scaled_pixels_per_ms:
+            self.note_rects = np.column_stack((
+                self.note_xs,
+                -np.rint(self.note_end_ms * pixels_per_ms),
+                self.note_widths,
+                np.rint((self.note_end_ms - self.note_start_ms) * pixels_per_ms),
+            )).astype(np.int32)
+            self.scaled_pixels_per_ms = pixels_per_ms
+
+        # Bovenkant van het venster: noten waarvan de onderkant nu bovenaan de pianorol verschijnt
+        self.next_note_index = int(np.searchsorted(self.note_start_ms, current_ms + fall_time_ms, side='right'))
+        # Onderkant van het venster: zelfs de langste noot die vóór dit punt begon, is al achter het toetsenbord verdwenen
+        oldest_visible_ms = current_ms - self.max_note_duration_ms
+        first_note_index = int(np.searchsorted(self.note_start_ms, oldest_visible_ms, side='left'))
+        window = slice(first_note_index, self.next_note_index)
+
+        # De onderkant van een noot bereikt de speellijn (onderkant van de roll) precies op zijn starttijd:
+        # y_top = ROLL_HEIGHT - (start - nu) * ppm - duur * ppm = ROLL_HEIGHT + nu * ppm - einde * ppm
+        rects = self.note_rects[window].copy()
+        rects[:, 1] += int(ROLL_HEIGHT + current_ms * pixels_per_ms)
+        # Noten die helemaal achter het toetsenbord zitten hoeven niet getekend
+        self.note_rects_on_screen = rects[rects[:, 1] < ROLL_HEIGHT]
 
-        num_playable_notes = OCTAVE_END_MIDI - OCTAVE_START_MIDI + 1
-        note_column_width = SCREEN_WIDTH / num_playable_notes
+    def draw_piano_roll_background(self):
+        """Tekent de achtergrond van de pianorol; deze wordt alleen opnieuw opgebouwd als een slider die hem bepaalt verandert."""
+        key = (self.fall_speed_slider.get_value(), self.bpm_slider.get_value(), self.beats_per_measure_top)
+        if key != self.roll_background_key:
+            self.roll_background_surface = self.render_piano_roll_background()
+            self.roll_background_key = key
+        self.screen.blit(self.roll_background_surface, (0, 0))
+
+    def render_piano_roll_background(self):
+        """Tekent de achtergrond van de pianorol (lijnen en balken) op een eigen Surface."""
+        surface = pygame.Surface((SCREEN_WIDTH, ROLL_HEIGHT))
+        pygame.draw.rect(surface, DARK_GRAY, (0, 0, SCREEN_WIDTH, ROLL_HEIGHT))
+        # Wordt bij elke frame opnieuw opgebouwd zolang een slider versleept wordt; lokale namen in de lussen
+        draw_line = pygame.draw.line
+
+        # Teken verticale lijnen langs de linkerrand van elke toets, zodat de kolommen op het toetsenbord aansluiten
+        for midi_note in range(OCTAVE_START_MIDI, OCTAVE_END_MIDI + 1):
+            x = NOTE_X_LUT[midi_note]
 
-        # Teken verticale lijnen voor elke nootkolom
-        for i in range(num_playable_notes):
-            x = i * note_column_width
-            midi_note = OCTAVE_START_MIDI + i
-            
             # Witte en zwarte toetsen afscheiding
-            if midi_note % 12 in [1, 3, 6, 8, 10]: # Zwarte toetsen
-                pygame.draw.line(self.screen, GRAY, (x, 0), (x, ROLL_HEIGHT), 1)
+            if IS_BLACK_KEY[midi_note]: # Zwarte toetsen
+                draw_line(surface, GRAY, (x, 0), (x, ROLL_HEIGHT), 1)
             else: # Witte toetsen
-                pygame.draw.line(self.screen, LIGHT_GRAY, (x, 0), (x, ROLL_HEIGHT), 1)
+                draw_line(surface, LIGHT_GRAY, (x, 0), (x, ROLL_HEIGHT), 1)
 
         # Teken horizontale lijnen voor maatstrepen (vereenvoudigd)
         # Dit moet gesynchroniseerd zijn met de BPM en maataanduiding
@@ -707,226 +978,114 @@ class PianoRollApp:
         # Hoe langer de 'valsnelheid' is ingesteld, hoe meer pixels per beat
         # Dit is een visuele weergave, niet de echte MIDI-tijd.
         
-        # De 'speellijn' onderaan de pianorol
-        pygame.draw.line(self.screen, RED, (0, ROLL_HEIGHT), (SCREEN_WIDTH, ROLL_HEIGHT), 3)
+        # De 'speellijn' onderaan de pianorol; een lijn van 3 px dik ligt op y-1..y+1, dus ROLL_HEIGHT - 2
+        # houdt hem volledig op deze Surface van ROLL_HEIGHT hoog
+        pygame.draw.line(surface, RED, (0, ROLL_HEIGHT - 2), (SCREEN_WIDTH, ROLL_HEIGHT - 2), 3)
 
         # Horizontale lijnen om de x aantal pixels voor visuele 'beats' of 'maten'
-        # Afhankelijk van de 'pixels per beat'
-        current_y_line = ROLL_HEIGHT - pixels_per_beat_visual # Start bij de speellijn en ga omhoog
-        while current_y_line > 0:
-            if (ROLL_HEIGHT - current_y_line) % (pixels_per_beat_visual * self.beats_per_measure_top) < 10: # Maatstreep
-                pygame.draw.line(self.screen, YELLOW, (0, current_y_line), (SCREEN_WIDTH, current_y_line), 2)
+        # Afhankelijk van de 'pixels per beat'. Er wordt per beat geteld (start bij de speellijn en ga
+        # omhoog), zodat een maatstreep een gehele deling is in plaats van een float-modulo met marge.
+        num_beats = math.ceil(ROLL_HEIGHT / pixels_per_beat_visual)
+        beats_per_measure = self.beats_per_measure_top
+        for beat in range(1, num_beats):
+            current_y_line = ROLL_HEIGHT - beat * pixels_per_beat_visual
+            if beat % beats_per_measure == 0: # Maatstreep
+                draw_line(surface, YELLOW, (0, current_y_line), (SCREEN_WIDTH, current_y_line), 2)
             else: # Beatstreep
-                pygame.draw.line(self.screen, GRAY, (0, current_y_line), (SCREEN_WIDTH, current_y_line), 1)
-            current_y_line -= pixels_per_beat_visual
+                draw_line(surface, GRAY, (0, current_y_line), (SCREEN_WIDTH, current_y_line), 1)
 
+        return surface.convert() # Zelfde pixelformaat als het scherm: snelste blit
 
-    def draw_piano_keyboard(self):
-        """Tekent het statische pianotoetsenbord onderaan."""
-        keyboard_y = SCREEN_HEIGHT - KEYBOARD_HEIGHT
-        pygame.draw.rect(self.screen, BLACK, (0, keyboard_y, SCREEN_WIDTH, KEYBOARD_HEIGHT))
-
-        # Teken de witte toetsen
-        white_keys_drawn = 0
-        current_x = 0
-        white_key_indices = [0, 2, 4, 5, 7, 9, 11] # C, D, E, F, G, A, B
+    def render_piano_keyboard(self):
+        """Tekent het statische pianotoetsenbord één keer op een eigen Surface (zie draw_piano_keyboard)."""
+        surface = pygame.Surface((SCREEN_WIDTH, KEYBOARD_HEIGHT))
+        keyboard_y = 0 # Lokaal op de Surface; deze wordt onderaan het scherm geblit
+        pygame.draw.rect(surface, BLACK, (0, keyboard_y, SCREEN_WIDTH, KEYBOARD_HEIGHT))
 
         # Bereken de start X-positie zodat de toetsen breed genoeg zijn om het hele scherm te vullen
         total_white_keys_in_range = 0
         for i in range(OCTAVE_START_MIDI, OCTAVE_END_MIDI + 1):
-            if i % 12 in white_key_indices:
+            if not is_black_key(i):
                 total_white_keys_in_range += 1
         
         effective_white_key_width = SCREEN_WIDTH / total_white_keys_in_range
         black_key_effective_width = effective_white_key_width * BLACK_KEY_WIDTH / WHITE_KEY_WIDTH # Proportioneel kleiner
 
-        key_rects = [] # Om later toetsen te kunnen highlighten indien nodig
-        
         # Trekken witte toetsen
         # Starten vanaf MIDI 21 (A0)
         current_x = 0
         for i in range(OCTAVE_START_MIDI, OCTAVE_END_MIDI + 1):
-            if i % 12 in white_key_indices: # Witte toets
+            if not is_black_key(i): # Witte toets
                 rect = pygame.Rect(current_x, keyboard_y, effective_white_key_width, KEYBOARD_HEIGHT)
-                pygame.draw.rect(self.screen, WHITE, rect)
-                pygame.draw.rect(self.screen, BLACK, rect, 1) # Rand
+                pygame.draw.rect(surface, WHITE, rect)
+                pygame.draw.rect(surface, BLACK, rect, 1) # Rand
                 
                 # Nootnaam toevoegen
                 note_name = get_note_name(i)
                 text_surf = self.font_small.render(note_name, True, BLACK)
                 text_rect = text_surf.get_rect(center=(rect.centerx, rect.bottom - 15))
-                self.screen.blit(text_surf, text_rect)
+                surface.blit(text_surf, text_rect)
                 
                 current_x += effective_white_key_width
-                key_rects.append({'note': i, 'rect': rect, 'color': WHITE})
-            else:
-                # Sla zwarte toetsen voor nu over en teken ze later bovenaan de witte toetsen
-                pass
+            # Zwarte toetsen worden hieronder, bovenop de witte, getekend
         
         # Trekken zwarte toetsen (bovenop de witte)
-        current_x_white_key_start = 0
+        num_white_keys_before = 0 # Lopende telling van de witte toetsen links van noot i
         for i in range(OCTAVE_START_MIDI, OCTAVE_END_MIDI + 1):
-            midi_note_mod_12 = i % 12
-            if midi_note_mod_12 in [1, 3, 6, 8, 10]: # Zwarte toetsen: C#, D#, F#, G#, A#
-                # De x-positie van de zwarte toets is tussen de twee witte toetsen
-                # Bijvoorbeeld: C# ligt tussen C en D.
-                # Eenvoudige benadering: plaats het op de helft van de vorige witte toets + helft van de huidige witte toets
-                # Dit is complexer om precies te doen met variabele breedtes.
-                # Voor nu, we bepalen de x-positie van de *bijbehorende* witte toets en schuiven hem dan op.
-                
-                # Vind de x-positie van de witte toets links van deze zwarte toets
-                # Bijvoorbeeld: voor C# (noot 1) is dat C (noot 0)
-                if midi_note_mod_12 == 1: # C#
-                    relative_white_note = i - 1
-                elif midi_note_mod_12 == 3: # D#
-                    relative_white_note = i - 1
-                elif midi_note_mod_12 == 6: # F#
-                    relative_white_note = i - 1
-                elif midi_note_mod_12 == 8: # G#
-                    relative_white_note = i - 1
-                elif midi_note_mod_12 == 10: # A#
-                    relative_white_note = i - 1
-                else:
-                    continue # Dit zou niet moeten gebeuren
-
-                # Bereken de x-positie van de witte toets links van de zwarte toets
-                base_white_x = self.get_note_x_position(relative_white_note) # Dit is de methode van pianorol
-                
-                # Dit is de correcte manier om de X-positie te berekenen op het toetsenbord.
-                # Zoek de x-positie van de *witte toets* die aan de linkerkant van deze zwarte toets grenst.
-                # Index van de witte toets in de array van alle witte toetsen.
-                num_white_keys_before = 0
-                for wk_midi in range(OCTAVE_START_MIDI, i):
-                    if wk_midi % 12 in white_key_indices:
-                        num_white_keys_before += 1
-                
-                black_key_x = (num_white_keys_before * effective_white_key_width) + (effective_white_key_width * 0.7) # Positioneren op 70% van de vorige witte toets
+            if not is_black_key(i): # Witte toets: alleen meetellen
+                num_white_keys_before += 1
+            else: # Zwarte toetsen: C#, D#, F#, G#, A#
+                # Een zwarte toets ligt gecentreerd op de grens tussen de witte toets links ervan
+                # (de num_white_keys_before-de) en de volgende witte toets
+                black_key_x = num_white_keys_before * effective_white_key_width
                 
                 rect = pygame.Rect(black_key_x - (black_key_effective_width / 2), keyboard_y, black_key_effective_width, KEYBOARD_HEIGHT * BLACK_KEY_HEIGHT_RATIO)
-                pygame.draw.rect(self.screen, BLACK, rect)
-                key_rects.append({'note': i, 'rect': rect, 'color': BLACK})
+                pygame.draw.rect(surface, BLACK, rect)
+
+        return surface.convert() # Zelfde pixelformaat als het scherm: snelste blit
+
+    def draw_piano_keyboard(self):
+        """Tekent het statische pianotoetsenbord onderaan."""
+        self.screen.blit(self.keyboard_surface, (0, SCREEN_HEIGHT - KEYBOARD_HEIGHT))
 
 
     def draw_ui_elements(self):
         """Tekent alle UI-elementen."""
         # Toon geladen MIDI-bestandsnaam
-        if self.loaded_midi_filename:
-            text_surf = self.font_small.render(f"Geladen: {self.loaded_midi_filename}", True, BLACK)
-            self.screen.blit(text_surf, (SCREEN_WIDTH - text_surf.get_width() - 20, 160))
+        if self.loaded_label_surf:
+            self.screen.blit(self.loaded_label_surf, (SCREEN_WIDTH - self.loaded_label_surf.get_width() - 20, 160))
 
         for element in self.ui_elements:
             element.draw(self.screen)
-        
-        # Werk de geselecteerde track bij als de dropdown open is
-        if self.track_dropdown:
-            if self.track_dropdown.get_selected_option() != self.current_selected_track and not self.track_dropdown.is_open:
-                self.current_selected_track = self.track_dropdown.get_selected_option()
-                self.stop_midi()
-                self.prepare_notes_for_playback()
 
 
     def draw(self):
-        self.screen.fill(WHITE) # Vul de achtergrond
-
+        # Geen fill van het hele scherm: de rolachtergrond (bovenaan) en het toetsenbord (onderaan)
+        # zijn ondoorzichtig en dekken samen elke pixel af
         self.draw_piano_roll_background()
         
-        # Teken de vallende noten
-        self.current_notes_on_screen.draw(self.screen)
+        # Teken de vallende noten in één blits-aanroep, geknipt tot de pianorol (het toetsenbord blijft onaangeroerd)
+        rects = self.note_rects_on_screen
+        tops = np.clip(rects[:, 1], 0, ROLL_HEIGHT)
+        heights = np.clip(rects[:, 1] + rects[:, 3], 0, ROLL_HEIGHT) - tops
+        column_surfaces = self.note_column_surfaces # Lokale naam: geen attribuut-lookup per noot
+        self.screen.blits([
+            (column_surfaces[w], (x, y), (0, 0, w, h))
+            for x, y, w, h in zip(rects[:, 0].tolist(), tops.tolist(), rects[:, 2].tolist(), heights.tolist())
+        ], doreturn=False)
         
-        self.draw_piano_keyboard()
+        if self.full_redraw_needed:
+            self.draw_piano_keyboard()
         self.draw_ui_elements()
 
-        pygame.display.flip() # Update het volledige scherm
-
-
-# --- Sprite voor vallende noten ---
-class FallingNote(pygame.sprite.Sprite):
-    def __init__(self, midi_note, start_time_ticks, duration_ticks, x_pos, width, height, current_bpm, ticks_per_beat, screen_height, keyboard_height, fall_time_seconds):
-        super().__init__()
-        self.midi_note = midi_note
-        self.start_time_ticks = start_time_ticks # Absolute starttijd in ticks
-        self.duration_ticks = duration_ticks # Duur in ticks
-        self.x_pos = x_pos # X-positie op de pianorol
-        self.width = width # Breedte van de noot
-        self.initial_height = height # Initiële hoogte van de noot op het scherm
-        
-        self.current_bpm = current_bpm
-        self.ticks_per_beat = ticks_per_beat
-        self.screen_height = screen_height
-        self.keyboard_height = keyboard_height
-        self.fall_time_seconds = fall_time_seconds # Tijd die de noot nodig heeft om het scherm over te steken
-        
-        self.image = pygame.Surface([self.width, self.initial_height])
-        self.image.fill(NOTE_COLOR)
-        self.rect = self.image.get_rect()
-        
-        # De noot wordt bovenaan het scherm gespawnd.
-        # De Y-positie zal worden berekend in update()
-        self.rect.x = int(self.x_pos)
-        self.rect.y = 0 # Placeholder, zal worden aangepast
-
-    def update(self, current_playback_time_ticks):
-        """
-        Berekent de Y-positie en hoogte van de noot op basis van de huidige afspeeltijd.
-        """
-        # Converteer MIDI-ticks naar milliseconden (real-time)
-        ms_per_beat = (60 / self.current_bpm) * 1000
-        ticks_per_ms = self.ticks_per_beat / ms_per_beat
-
-        start_time_ms = self.start_time_ticks / ticks_per_ms
-        duration_ms = self.duration_ticks / ticks_per_ms
-        current_playback_time_ms = current_playback_time_ticks / ticks_per_ms
-
-        # Y-positie van de speellijn (onderkant van de roll)
-        play_line_y = self.screen_height - self.keyboard_height
-
-        # Tijd die de noot nodig heeft om van boven naar de speellijn te vallen (in ms)
-        # Dit is de 'fall_time_seconds' van de app, geconverteerd naar ms
-        fall_time_ms = self.fall_time_seconds * 1000
-
-        # Bereken de Y-positie van de top van de noot
-        # De noot moet op `start_time_ms` de `play_line_y` bereiken
-        # y = play_line_y - ((start_time_ms - current_playback_time_ms) / fall_time_ms) * ROLL_HEIGHT
-        
-        # De 'top' van de noot beweegt
-        # De 'bodem' van de noot moet de play_line_y bereiken op start_time_ms
-        # Y_bodem = play_line_y
-        
-        # De noot beweegt met een constante snelheid in pixels/ms
-        # pixels_per_ms = (ROLL_HEIGHT) / fall_time_ms
-        
-        # Als de noot omhoog beweegt (naar boven in de pianorol), dan is de Y-coördinaat kleiner.
-        # Als de noot naar beneden beweegt, dan is de Y-coördinaat groter.
-        # De noten 'komen aan' bij play_line_y op hun start_time_ms.
-        # Hun *bovenkant* moet de play_line_y bereiken op (start_time_ms + duration_ms)
-        
-        # y_bottom (waar de noot het toetsenbord raakt) moet play_line_y zijn op start_time_ms
-        # y_top (waar de noot begint) moet op play_line_y - ROLL_HEIGHT zijn op (start_time_ms - fall_time_ms)
-        
-        # Current time difference from target hit time
-        time_to_hit_line_ms = start_time_ms - current_playback_time_ms
-        
-        # Y position of the bottom of the note
-        # This is where the note reaches the play line at `start_time_ms`
-        # If time_to_hit_line_ms is positive, the note is still above the line.
-        # If negative, it has passed the line.
-        
-        # Y positie van de onderkant van de noot:
-        # Dit is play_line_y als time_to_hit_line_ms = 0
-        # Dit is play_line_y - (pixels_per_ms * time_to_hit_line_ms)
-        
-        # pixels_per_ms = ROLL_HEIGHT / fall_time_ms
-        y_bottom_of_note = play_line_y - (time_to_hit_line_ms / fall_time_ms) * ROLL_HEIGHT
-        
-        # De hoogte van de noot verandert niet
-        self.rect.height = self.initial_height
-        
-        # Bereken de Y-positie van de *bovenkant* van de noot
-        self.rect.y = int(y_bottom_of_note - self.rect.height)
-        
-        # Verwijder noot als deze volledig buiten beeld is en voorbij de speellijn
-        if self.rect.top > self.screen_height:
-            self.kill() # Verwijdert de sprite van alle groepen
+        # Bewust geen dirty rects per noot (of pygame.sprite.LayeredDirty): bij veel kleine bewegende
+        # noten over de hele rol kost het bijhouden daarvan meer dan het oplevert. Eén rechthoek voor
+        # de hele pianorol is hier het goedkoopst.
+        if self.full_redraw_needed:
+            pygame.display.flip() # Update het volledige scherm
+            self.full_redraw_needed = False
+        else:
+            pygame.display.update(self.roll_rect)
 
 
 # --- Hoofduitvoering ---
@@ -1,8 +1,24 @@
+import os
+import numpy as np
 from mido import MidiFile
 
+_midi_cache = {}
+
+def open_midi_file(midi_path):
+    """Leest een MIDI-bestand één keer in; trackkeuze en herstart hergebruiken het resultaat."""
+    stat = os.stat(midi_path)
+    key = (midi_path, stat.st_mtime_ns, stat.st_size)
+    mid = _midi_cache.get(key)
+    if mid is None:
+        mid = MidiFile(midi_path)
+        _midi_cache.clear()
+        _midi_cache[key] = mid
+    return mid
+
+
 def get_midi_tracks(midi_path):
     try:
-        mid = MidiFile(midi_path)
+        mid = open_midi_file(midi_path)
     except Exception as e:
         print(f"Fout bij laden MIDI-bestand: {e}")
         return []
@@ -21,28 +37,65 @@ def get_midi_tracks(midi_path):
     return tracks_info
 
 
+def get_tempo_changes(mid):
+    """(tick, tempo)-paren van alle set_tempo-events; in type-1-bestanden staan die meestal in track 0."""
+    tempo_changes = []
+    for track in mid.tracks:
+        tick = 0
+        for msg in track:
+            tick += msg.time
+            if msg.type == 'set_tempo':
+                tempo_changes.append((tick, msg.tempo))
+    tempo_changes.sort(key=lambda change: change[0])
+    return tempo_changes
+
+
+def ticks_to_seconds(ticks, tempo_changes, ticks_per_beat):
+    """Rekent een array absolute ticks in één keer om naar seconden.
+
+    Per tempowissel het aantal seconden tot dat punt (cumsum); elke tick valt met searchsorted in
+    zijn tempostuk. Anders dan np.interp loopt dit na de laatste wissel gewoon door.
+    """
+    break_ticks = np.array([0] + [tick for tick, _ in tempo_changes], dtype=np.float64)
+    tempos = np.array([500000] + [tempo for _, tempo in tempo_changes], dtype=np.float64)  # standaard 120 BPM
+    seconds_per_tick = tempos / ticks_per_beat / 1e6
+    break_seconds = np.concatenate(([0.0], np.cumsum(np.diff(break_ticks) * seconds_per_tick[:-1])))
+    segment = np.searchsorted(break_ticks, ticks, side='right') - 1
+    return break_seconds[segment] + (ticks - break_ticks[segment]) * seconds_per_tick[segment]
+
+
 def load_midi_notes(midi_path, selected_track_index=0):
+    """Geeft (starts, ends, notes, velocities) als NumPy-arrays terug, gesorteerd op starttijd."""
+    start_ticks, end_ticks, notes, velocities = [], [], [], []
     try:
-        mid = MidiFile(midi_path)
+        mid = open_midi_file(midi_path)
     except Exception as e:
         print(f"Fout bij laden MIDI-bestand: {e}")
-        return []
+        mid = None
 
-    notes = []
-    current_time = 0.0
-    active_notes = {}
+    current_tick = 0
+    active_notes = {}  # noot -> (starttick, velocity)
 
-    selected_track = mid.tracks[selected_track_index]
+    selected_track = mid.tracks[selected_track_index] if mid else []
 
     for msg in selected_track:
-        current_time += msg.time
+        current_tick += msg.time
         if msg.type == 'note_on' and msg.velocity > 0:
-            active_notes[msg.note] = {'start_time': current_time, 'velocity': msg.velocity}
+            active_notes[msg.note] = (current_tick, msg.velocity)
         elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
             note_data = active_notes.pop(msg.note, None)
             if note_data:
-                note_data['end_time'] = current_time
-                note_data['note'] = msg.note
-                notes.append(note_data)
+                start_ticks.append(note_data[0])
+                end_ticks.append(current_tick)
+                notes.append(msg.note)
+                velocities.append(note_data[1])
 
-    return notes
+    # Noten worden bij hun note_off toegevoegd; stabiel sorteren op starttick
+    start_ticks = np.array(start_ticks, dtype=np.float64)
+    order = np.argsort(start_ticks, kind='stable')
+    # Ticks in één keer naar seconden, met de tempowissels uit alle tracks
+    tempo_changes = get_tempo_changes(mid) if mid else []
+    ticks_per_beat = mid.ticks_per_beat if mid else 480
+    starts = ticks_to_seconds(start_ticks[order], tempo_changes, ticks_per_beat)
+    ends = ticks_to_seconds(np.array(end_ticks, dtype=np.float64)[order], tempo_changes, ticks_per_beat)
+    return starts, ends, np.array(notes, dtype=np.uint8)[order], np.array(velocities, dtype=np.uint8)[order]
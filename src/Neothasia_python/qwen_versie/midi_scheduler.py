@@ -0,0 +1,116 @@
+import pygame.midi
+import time
+import threading
+import numpy as np
+from mido import MidiFile
+
+# Zo ver (in ms) worden noten vooruit aan PortMidi gegeven, dat ze zelf op tijd verstuurt
+LOOKAHEAD_MS = 50
+
+EVENT_DTYPE = np.dtype([('t', 'f8'), ('status', 'u1'), ('note', 'u1'), ('velocity', 'u1')])
+
+def build_event_table(mid):
+    """Alle note_on/note_off-events als één array (tijd in seconden, status, noot, velocity)."""
+    rows = []
+    song_time = 0.0
+    for msg in mid:  # mido voegt de tracks samen en rekent met de tempowissels om naar seconden
+        song_time += msg.time
+        if msg.type == 'note_on':
+            rows.append((song_time, 0x90, msg.note, msg.velocity))
+        elif msg.type == 'note_off':
+            rows.append((song_time, 0x80, msg.note, msg.velocity))
+    return np.array(rows, dtype=EVENT_DTYPE)
+
+
+class ScheduledMIDIOutput:
+    """
+    Gedeelde afspeellogica van de synthesizers: een eventtabel per bestand en een afspeelthread die
+    de noten met PortMidi-tijdstempels vooruit inplant. Subklassen kiezen alleen het apparaat: ze
+    zetten self.device_id en openen self.player met open_output() (of laten die None).
+    """
+
+    def __init__(self):
+        pygame.midi.init()
+        self.player = None
+        self.device_id = None
+        self.stop_flag = True
+        self.thread = None
+        self.events = None
+        self.events_path = None
+
+    def open_output(self):
+        return pygame.midi.Output(self.device_id, latency=LOOKAHEAD_MS)
+
+    def play_midi(self, midi_path, start_ms=0.0):
+        """Speelt midi_path af vanaf start_ms (bij hervatten: de songtijd van de visualizer)."""
+        if not self.player:
+            print("Kan MIDI niet afspelen: Geen geldig output apparaat.")
+            return
+        # Een andere track of ander bestand tijdens het afspelen: eerst de lopende thread stoppen,
+        # anders schrijven er twee threads naar dezelfde PortMidi-stream
+        if self.thread is not None:
+            self.stop()
+
+        def play():
+            try:
+                self.schedule_midi(self.load_events(midi_path), start_ms)
+            except Exception as e:
+                print(f"Fout bij afspelen MIDI: {e}")
+
+        self.stop_flag = False
+        self.thread = threading.Thread(target=play)
+        self.thread.start()
+
+    def load_events(self, midi_path):
+        # Eén keer per bestand; hervatten na een pauze gebruikt dezelfde tabel
+        if midi_path != self.events_path:
+            self.events = build_event_table(MidiFile(midi_path))
+            self.events_path = midi_path
+        return self.events
+
+    def schedule_midi(self, events, start_ms=0.0):
+        """Stuurt noten met een absoluut tijdstempel (PortMidi-klok) hooguit LOOKAHEAD_MS vooruit."""
+        # Hervatten: events vóór start_ms overslaan en de rest ten opzichte van start_ms inplannen
+        events = events[np.searchsorted(events['t'], start_ms / 1000):]
+        timestamps = (pygame.midi.time() + events['t'] * 1000 - start_ms).astype(np.int64)
+        messages = [[[status, note, velocity], timestamp]
+                    for timestamp, status, note, velocity in zip(timestamps.tolist(), events['status'].tolist(),
+                                                                 events['note'].tolist(), events['velocity'].tolist())]
+        sent = 0
+        while sent < len(messages) and not self.stop_flag:
+            # Alles wat binnen het venster valt in één write; PortMidi neemt er hooguit 1024 tegelijk
+            due = np.searchsorted(timestamps, pygame.midi.time() + LOOKAHEAD_MS, side='right')
+            due = min(due, sent + 1024)
+            if due > sent:
+                self.player.write(messages[sent:due])
+                sent = due
+            else:
+                time.sleep(LOOKAHEAD_MS / 2000)
+
+    def stop(self):
+        self.stop_flag = True
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.player:
+            # Nog niet verstuurde noten uit de PortMidi-wachtrij gooien; anders klinken de note_ons
+            # van de komende LOOKAHEAD_MS nog, zonder hun note_offs. Na abort() moet de stream
+            # meteen dicht, dus een nieuwe openen (ook voor hervatten) en daarop All Notes Off per kanaal.
+            self.player.abort()
+            self.player.close()
+            self.player = self.open_output()
+            for channel in range(16):
+                self.player.write_short(0xB0 | channel, 123, 0)
+        print("MIDI output gestopt.")
+
+    def close(self):
+        """Stopt het afspelen, sluit de MIDI output en sluit pygame.midi af."""
+        self.stop_flag = True
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.player:
+            self.player.abort()
+            self.player.close()
+            self.player = None
+        pygame.midi.quit()
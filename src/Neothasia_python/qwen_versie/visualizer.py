@@ -1,6 +1,8 @@
 import pygame
 import pygame_gui
+import numpy as np
 import sys
+import time
 import tkinter as tk
 from tkinter import filedialog
 from midi_parser import load_midi_notes, get_midi_tracks
@@ -33,9 +35,14 @@ class NoteVisualizer:
         self.font = pygame.font.SysFont('Arial', 16)
         self.manager = pygame_gui.UIManager((SCREEN_WIDTH, SCREEN_HEIGHT))
 
-        self.notes = []
+        self.starts = np.empty(0)
+        self.durations = np.empty(0)
+        self.note_xs = np.empty(0, dtype=np.int32)
+        self.max_duration = 0.0
         self.midi_path = None
         self.synth = MIDISynthesizer()
+        # Eén verborgen Tk-root, bij de eerste bestandskiezer aangemaakt en daarna hergebruikt
+        self.tk_root = None
 
         # UI Variabelen
         self.selected_track_index = 0
@@ -43,7 +50,23 @@ class NoteVisualizer:
         self.playing = False
         self.bpm = DEFAULT_BPM
         self.note_speed = NOTE_SPEED_BASE
-        self.start_time = 0
+        self.start_time = 0.0
+        self.song_time = 0.0  # Eén klokmeting per frame, gezet in run()
+
+        # (notenummer, nootnaam) voor A0 t/m B7; toetsenbord en X-posities worden hier één keer uit opgebouwd
+        self.keys = [(n, note_number_to_name(n)) for n in range(21, 108)]
+        white_notes = [n for n, name in self.keys if len(name) == 2]
+        self.note_x = {n: index * 35 for index, n in enumerate(white_notes)}
+        self.note_x_lut = np.array([self.map_note_to_x(n) for n in range(128)], dtype=np.int32)
+        # Het toetsenbord verandert nooit: één keer tekenen en daarna alleen nog blitten
+        self.keyboard_surf = self.render_keyboard()
+        # Eén gevulde notenkolom zo hoog als de pianorol; elke noot is daar een uitsnede van
+        self.note_surf = pygame.Surface((30, SCREEN_HEIGHT - KEYBOARD_HEIGHT)).convert()
+        self.note_surf.fill((255, 200, 0))
+        # Alleen de pianorol (met de UI erin) verandert per frame; het toetsenbord gaat alleen bij
+        # de eerste frame en na een WINDOWEXPOSED opnieuw naar het scherm
+        self.roll_rect = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT - KEYBOARD_HEIGHT)
+        self.full_redraw_needed = True
 
         # UI Elements
         self.track_dropdown = None
@@ -122,8 +145,9 @@ class NoteVisualizer:
         )
 
     def select_midi_file(self):
-        root = tk.Tk()
-        root.withdraw()
+        if self.tk_root is None:
+            self.tk_root = tk.Tk()
+            self.tk_root.withdraw()
         file_path = filedialog.askopenfilename(filetypes=[("MIDI Files", "*.mid")])
         if file_path:
             self.midi_path = file_path
@@ -132,47 +156,47 @@ class NoteVisualizer:
             self.load_notes_and_start_playback()
 
     def load_notes_and_start_playback(self):
-        self.notes = load_midi_notes(self.midi_path, self.selected_track_index)
-        self.start_time = pygame.time.get_ticks() / 1000
+        # Per eigenschap een NumPy-array, gesorteerd op starttijd
+        self.starts, ends, notes, _ = load_midi_notes(self.midi_path, self.selected_track_index)
+        self.durations = ends - self.starts
+        self.note_xs = self.note_x_lut[notes]
+        self.max_duration = float(self.durations.max()) if len(self.starts) else 0.0
+        self.start_time = time.perf_counter()
         self.playing = True
         self.synth.play_midi(self.midi_path)
 
     def draw_piano_roll(self):
-        now = pygame.time.get_ticks() / 1000 - self.start_time
-        for note in self.notes:
-            start_sec = note['start_time']
-            end_sec = note['end_time']
-
-            if now < start_sec:
-                continue
-
-            y_pos = (start_sec - now) * self.note_speed + 50
-            if y_pos > SCREEN_HEIGHT - KEYBOARD_HEIGHT:
-                continue
-
-            rect_height = max(20, (end_sec - start_sec) * self.note_speed)
-            key_x = self.map_note_to_x(note['note'])
-
-            color = (255, 200, 0)
-            pygame.draw.rect(self.screen, color, (key_x, y_pos, 30, rect_height))
+        now = self.song_time
+        # Alleen het venster van noten die al gestart zijn en nog niet boven uit beeld geschoven;
+        # de langste noot bepaalt hoe ver terug een noot nog zichtbaar kan zijn
+        max_height = max(20, self.max_duration * self.note_speed)
+        lo = np.searchsorted(self.starts, now - (50 + max_height) / self.note_speed)
+        hi = np.searchsorted(self.starts, now, side='right')
+        y_pos = (self.starts[lo:hi] - now) * self.note_speed + 50
+        rect_heights = np.maximum(20, self.durations[lo:hi] * self.note_speed)
+
+        # Afkappen naar gehele pixels zoals pygame.Rect dat doet, en bijsnijden tot de pianorol,
+        # zodat alle noten in één blits-aanroep kunnen
+        tops = y_pos.astype(np.int64)
+        bottoms = np.minimum(tops + rect_heights.astype(np.int64), SCREEN_HEIGHT - KEYBOARD_HEIGHT)
+        np.maximum(tops, 0, out=tops)
+        shown = bottoms > tops
+        self.screen.blits([(self.note_surf, (key_x, top), (0, 0, 30, bottom - top))
+                           for key_x, top, bottom in zip(self.note_xs[lo:hi][shown].tolist(),
+                                                         tops[shown].tolist(), bottoms[shown].tolist())],
+                          doreturn=False)
 
     def map_note_to_x(self, note_number):
-        base_note = 21  # A0
-        white_notes = [n for n in range(base_note, 108) if len(note_number_to_name(n)) == 2]
-        try:
-            index = white_notes.index(note_number)
-            return index * 35
-        except ValueError:
-            return 0
+        return self.note_x.get(note_number, 0)
 
-    def draw_keyboard(self):
-        self.screen.fill((20, 20, 20),
-                         (0, SCREEN_HEIGHT - KEYBOARD_HEIGHT, SCREEN_WIDTH, KEYBOARD_HEIGHT))
+    def render_keyboard(self):
+        surf = pygame.Surface((SCREEN_WIDTH, KEYBOARD_HEIGHT)).convert()
+        surf.fill((20, 20, 20))
 
         x = 0
-        note_num = 21  # A0
-        while x < SCREEN_WIDTH and note_num < 108:
-            note_name = note_number_to_name(note_num)
+        for note_num, note_name in self.keys:
+            if x >= SCREEN_WIDTH:
+                break
 
             if len(note_name) == 2:  # Witte toets
                 color = (255, 255, 255)
@@ -180,14 +204,16 @@ class NoteVisualizer:
                 color = (0, 0, 0)
                 x -= 15  # Maak ruimte voor zwarte toets
 
-            pygame.draw.rect(self.screen, color,
-                             (x, SCREEN_HEIGHT - KEYBOARD_HEIGHT, 35, KEYBOARD_HEIGHT), 1)
+            pygame.draw.rect(surf, color, (x, 0, 35, KEYBOARD_HEIGHT), 1)
 
             text = self.font.render(note_name, True, (255, 255, 255))
-            self.screen.blit(text, (x + 5, SCREEN_HEIGHT - KEYBOARD_HEIGHT + 5))
+            surf.blit(text, (x + 5, 5))
 
             x += 35
-            note_num += 1
+        return surf
+
+    def draw_keyboard(self):
+        self.screen.blit(self.keyboard_surf, (0, SCREEN_HEIGHT - KEYBOARD_HEIGHT))
 
     def run(self):
         self.select_midi_file()
@@ -197,9 +223,13 @@ class NoteVisualizer:
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.synth.close()
                     pygame.quit()
                     sys.exit()
 
+                elif event.type == pygame.WINDOWEXPOSED:
+                    self.full_redraw_needed = True
+
                 elif event.type == pygame.USEREVENT:
                     if event.user_type == pygame_gui.UI_DROP_DOWN_MENU_CHANGED:
                         if event.ui_element == self.track_dropdown:
@@ -221,18 +251,28 @@ class NoteVisualizer:
                             if self.paused:
                                 self.synth.stop()
                             else:
-                                self.synth.play_midi(self.midi_path)
+                                # De songklok liep tijdens de pauze door; de audio gaat verder op dezelfde plek
+                                self.synth.play_midi(self.midi_path, (time.perf_counter() - self.start_time) * 1000)
                         elif event.ui_element == self.stop_button:
                             self.playing = False
                             self.synth.stop()
 
                 self.manager.process_events(event)
 
+            # Pas na de events: een nieuw gekozen track of bestand zet start_time opnieuw
+            self.song_time = time.perf_counter() - self.start_time
             self.manager.update(dt)
 
-            self.screen.fill((20, 20, 20))
+            # Alleen de pianorol wissen; het toetsenbord blijft staan en wordt alleen bij een
+            # volledige hertekening opnieuw geblit (de noten worden al tot de rol bijgesneden)
+            self.screen.fill((20, 20, 20), self.roll_rect)
             if self.playing and not self.paused:
                 self.draw_piano_roll()
-            self.draw_keyboard()
+            if self.full_redraw_needed:
+                self.draw_keyboard()
             self.manager.draw_ui(self.screen)
-            pygame.display.flip()
+            if self.full_redraw_needed:
+                pygame.display.flip()
+                self.full_redraw_needed = False
+            else:
+                pygame.display.update(self.roll_rect)